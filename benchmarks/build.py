@@ -0,0 +1,261 @@
+"""Benchmark generate_pages.py builds on a synthetic catalogue served locally.
+
+Usage: python benchmarks/build.py [--universities 200] [--logos 3] [--latency 0.02]
+                                  [--failure-rate 0.01] [--build-args "--jobs 8"]
+                                  [--output results.json]
+
+Generates a synthetic catalogue (universities, logos per university, special
+occasions and a parent/predecessor graph of configurable density) in a
+temporary site directory, serves its images from a local HTTP stand-in with
+configurable latency and failure rate, and measures:
+
+- a full build from an empty image store
+- an incremental rebuild with nothing changed
+- an incremental rebuild after editing a fraction of the records
+
+For each, the wall-clock time, the time spent building the index and the
+peak memory of the build process are reported. Every build runs in its own
+process against this checkout's generate_pages.py, and everything is
+derived from --seed, so results can be compared across commits.
+"""
+import argparse
+import hashlib
+import io
+import json
+import platform
+import random
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+ROOT = Path(__file__).resolve().parent.parent
+
+from search_index import KINDS, make_word
+
+OCCASIONS = ['Anniversary', 'Centenary', 'Pride Month', 'Jubilee', 'Olympics']
+
+def generate_catalogue(data_dir, image_base_url, universities=200, logos=3, occasions=0.2,
+                       parent_density=0.1, predecessor_density=0.1, seed=1):
+    """Write ``universities`` synthetic records to ``data_dir``.
+
+    Each record gets ``logos`` logos; a fraction ``occasions`` of them gets a
+    special occasion logo. Each record links to an earlier one as a parent
+    with probability ``parent_density`` and as a predecessor with probability
+    ``predecessor_density``, so the graph has no cycles. Returns the list of
+    written file paths.
+    """
+    rng = random.Random(seed)
+    countries = [make_word(rng) for _ in range(max(1, universities // 20))]
+    data_dir.mkdir(parents=True, exist_ok=True)
+    names = []
+    paths = []
+    for number in range(universities):
+        name = f"{make_word(rng)} {rng.choice(KINDS)} {number}"
+        founded = rng.randint(1100, 1990)
+        years = sorted(rng.sample(range(founded, 2025), min(logos, 2025 - founded)))
+        extension = rng.choice(['png', 'png', 'jpg'])
+        record = {
+            'name': name,
+            'location': {'city': make_word(rng), 'country': rng.choice(countries)},
+            'founded': str(founded),
+            'logoHistory': [
+                {
+                    'year': str(year),
+                    'isEstimated': rng.random() < 0.2,
+                    'description': f"Logo of {name} introduced in {year}.",
+                    'imageUrl': f"{image_base_url}/{number}/{year}.{extension}",
+                    'isCurrent': year == years[-1],
+                    'source': {'url': f"https://example.org/{number}/{year}", 'title': f"{name} archives"},
+                }
+                for year in years
+            ],
+            'specialOccasions': [],
+            'predecessors': [],
+            'parentInstitutions': [],
+        }
+        if rng.random() < occasions:
+            year = rng.randint(founded, 2024)
+            occasion = rng.choice(OCCASIONS)
+            record['specialOccasions'].append({
+                'year': str(year),
+                'occasion': occasion,
+                'description': f"{occasion} logo.",
+                'imageUrl': f"{image_base_url}/{number}/special-{year}.png",
+                'source': {'url': f"https://example.org/{number}/special", 'title': f"{name} archives"},
+            })
+        for relation, density in (('parentInstitutions', parent_density), ('predecessors', predecessor_density)):
+            if names and rng.random() < density:
+                record[relation].append({'name': rng.choice(names), 'year': str(rng.randint(founded, 2024))})
+        names.append(name)
+        
+        path = data_dir / f"{number:06d}.json"
+        path.write_text(json.dumps(record, indent=2, ensure_ascii=False), encoding='utf-8')
+        paths.append(path)
+    return paths
+
+def edit_catalogue(paths, fraction, seed=1):
+    """Change the description of the first logo in a fraction of the records."""
+    rng = random.Random(seed)
+    edited = rng.sample(paths, max(1, round(len(paths) * fraction)))
+    for path in edited:
+        record = json.loads(path.read_text(encoding='utf-8'))
+        if record['logoHistory']:
+            record['logoHistory'][0]['description'] += ' (edited)'
+        path.write_text(json.dumps(record, indent=2, ensure_ascii=False), encoding='utf-8')
+    return len(edited)
+
+def render_image(path):
+    """Return deterministic PNG or JPEG bytes for an image path."""
+    digest = hashlib.sha256(path.encode('utf-8')).digest()
+    image = Image.new('RGB', (480, 240), tuple(digest[:3]))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((140, 20, 340, 220), fill=tuple(digest[3:6]))
+    draw.rectangle((20, 180, 460, 220), fill=tuple(digest[6:9]))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG' if path.endswith('.jpg') else 'PNG')
+    return buffer.getvalue()
+
+def start_image_server(latency=0.0, failure_rate=0.0):
+    """Serve synthetic images on a free local port; returns (server, base_url).
+
+    Every response is delayed by ``latency`` seconds. A fixed fraction
+    ``failure_rate`` of the paths, chosen by hash, answers 404, so the same
+    images fail in every run.
+    """
+    cache = {}
+    cache_lock = threading.Lock()
+    
+    class ImageHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            digest = hashlib.sha256(self.path.encode('utf-8')).digest()
+            if int.from_bytes(digest[:4], 'big') / 2 ** 32 < failure_rate:
+                self.send_error(404)
+                return
+            with cache_lock:
+                if self.path not in cache:
+                    cache[self.path] = render_image(self.path)
+                data = cache[self.path]
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/jpeg' if self.path.endswith('.jpg') else 'image/png')
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('ETag', f'"{hashlib.sha256(data).hexdigest()[:16]}"')
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# Runs one build in a fresh process and reports its peak memory
+RUNNER = '''
+import json, resource, sys
+sys.path.insert(0, sys.argv[1])
+import generate_pages
+exit_code = generate_pages.main(sys.argv[3:])
+# ru_maxrss is in KiB on Linux and in bytes on macOS
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+with open(sys.argv[2], 'w') as f:
+    json.dump({'exitCode': exit_code, 'peakRss': peak if sys.platform != 'darwin' else peak // 1024}, f)
+'''
+
+def run_build(site_dir, build_args):
+    """Run generate_pages.main in ``site_dir`` and return its measurements."""
+    result_path = site_dir / '.benchmark-result.json'
+    report_path = site_dir / '.benchmark-report.json'
+    command = [sys.executable, '-c', RUNNER, str(ROOT), str(result_path), '--report', str(report_path)] + build_args
+    start = time.perf_counter()
+    subprocess.run(command, cwd=site_dir, check=True, stdout=subprocess.DEVNULL)
+    seconds = time.perf_counter() - start
+    result = json.loads(result_path.read_text())
+    report = json.loads(report_path.read_text())
+    return {
+        'seconds': round(seconds, 3),
+        'indexSeconds': round(report['timings'].get('stage.index', {}).get('seconds', 0.0), 3),
+        'peakRssKiB': result['peakRss'],
+        'exitCode': result['exitCode'],
+        'counters': report['counters'],
+    }
+
+def get_commit():
+    """Return the commit of this checkout, or None outside git."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--universities', type=int, default=200)
+    parser.add_argument('--logos', type=int, default=3, help='logos per university')
+    parser.add_argument('--occasions', type=float, default=0.2,
+                        help='fraction of universities with a special occasion logo')
+    parser.add_argument('--parent-density', type=float, default=0.1,
+                        help='probability that a university has a parent institution')
+    parser.add_argument('--predecessor-density', type=float, default=0.1,
+                        help='probability that a university has a predecessor')
+    parser.add_argument('--latency', type=float, default=0.02, help='image server latency in seconds')
+    parser.add_argument('--failure-rate', type=float, default=0.01, help='fraction of images answering 404')
+    parser.add_argument('--edit-fraction', type=float, default=0.05,
+                        help='fraction of records edited before the last incremental rebuild')
+    parser.add_argument('--build-args', default='', help='extra generate_pages.py arguments, e.g. "--jobs 8"')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help='keep the temporary site directory')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+    build_args = shlex.split(args.build_args)
+    
+    server, base_url = start_image_server(args.latency, args.failure_rate)
+    site_dir = Path(tempfile.mkdtemp(prefix='logo-benchmark-'))
+    try:
+        paths = generate_catalogue(
+            site_dir / 'data' / 'universities', base_url,
+            universities=args.universities, logos=args.logos, occasions=args.occasions,
+            parent_density=args.parent_density, predecessor_density=args.predecessor_density, seed=args.seed,
+        )
+        print(f"Synthetic catalogue: {len(paths)} universities in {site_dir}")
+        
+        results = {}
+        results['full'] = run_build(site_dir, build_args)
+        results['incrementalNoop'] = run_build(site_dir, ['--incremental'] + build_args)
+        edited = edit_catalogue(paths, args.edit_fraction, args.seed)
+        results['incrementalEdit'] = run_build(site_dir, ['--incremental'] + build_args)
+        
+        for name, result in results.items():
+            counters = result['counters']
+            print(f"  {name:18} {result['seconds']:8.2f} s  index {result['indexSeconds']:6.2f} s  "
+                  f"peak {result['peakRssKiB'] / 1024:7.1f} MiB  "
+                  f"{counters.get('pages.generated', 0)} page(s), {counters.get('http.requests', 0)} request(s)")
+        print(f"  ({edited} record(s) edited before incrementalEdit)")
+    finally:
+        server.shutdown()
+        if args.keep:
+            print(f"Kept {site_dir}")
+        else:
+            shutil.rmtree(site_dir)
+    
+    if args.output:
+        output = {
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'parameters': vars(args),
+            'results': results,
+        }
+        Path(args.output).write_text(json.dumps(output, indent=2) + '\n', encoding='utf-8')
+        print(f"Wrote {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Benchmark the prebuilt front-page search index on a synthetic catalogue.
+
+Usage: python benchmarks/search_index.py [--universities 50000] [--seed 1]
+
+Measures how long generate_pages.build_search_index takes, how large the
+index is on the wire, and how long queries take with the Python reference
+implementation and, if node is installed, with the script.js implementation
+the front page actually runs.
+"""
+import argparse
+import gzip
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import generate_pages
+
+SYLLABLES = ['ba', 'bel', 'cor', 'dan', 'el', 'fa', 'gre', 'ha', 'is', 'jo', 'ka', 'lu', 'mar', 'no',
+             'or', 'pal', 'que', 'ros', 'sa', 'tel', 'ur', 'val', 'wen', 'xa', 'yor', 'zé', 'ço', 'ñu']
+KINDS = ['University', 'Institute of Technology', 'College', 'École', 'Polytechnic', 'Academy', 'Universität']
+
+QUERIES = ['u', 'uni', 'university', 'pal', 'sa tel', 'ecole', 'zeb', 'marno', 'institute tech', 'nothingmatches']
+
+def make_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+def generate_entries(count, seed=1):
+    """Return ``count`` synthetic index entries sorted by name."""
+    rng = random.Random(seed)
+    countries = [make_word(rng) for _ in range(150)]
+    entries = []
+    for number in range(count):
+        name = f"{make_word(rng)} {rng.choice(KINDS)} {make_word(rng)}"
+        entries.append({
+            'id': f"{generate_pages.sanitize_id(name)}-{number}",
+            'name': name,
+            'location': {'city': make_word(rng), 'country': rng.choice(countries)},
+            'founded': str(rng.randint(1100, 2024)),
+        })
+    entries.sort(key=lambda entry: entry['name'])
+    return entries
+
+def time_call(function, repeat):
+    """Return the mean wall-clock time of ``function()`` in milliseconds."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+NODE_SCRIPT = '''
+const fs = require('fs');
+global.document = { addEventListener() {} };
+eval(fs.readFileSync(process.argv[2], 'utf8'));
+const searchIndex = JSON.parse(fs.readFileSync(process.argv[3], 'utf8'));
+const results = {};
+for (const query of JSON.parse(process.argv[4])) {
+    const repeat = 200;
+    const start = process.hrtime.bigint();
+    let matches;
+    for (let i = 0; i < repeat; i++) {
+        matches = searchUniversities(searchIndex, query, '');
+    }
+    results[query] = [Number(process.hrtime.bigint() - start) / 1e6 / repeat, matches.length];
+}
+console.log(JSON.stringify(results));
+'''
+
+def benchmark_node(search_index_path):
+    """Time the script.js query implementation, or return None without node."""
+    node = shutil.which('node')
+    if node is None:
+        return None
+    with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False) as f:
+        f.write(NODE_SCRIPT)
+    try:
+        output = subprocess.run(
+            [node, f.name, str(ROOT / 'script.js'), str(search_index_path), json.dumps(QUERIES)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+    finally:
+        Path(f.name).unlink()
+    return json.loads(output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--universities', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    
+    entries = generate_entries(args.universities, args.seed)
+    print(f"Synthetic catalogue: {len(entries)} universities")
+    
+    search_index = None
+    def build():
+        nonlocal search_index
+        search_index = generate_pages.build_search_index(entries)
+    print(f"build_search_index: {time_call(build, 3):.1f} ms")
+    
+    data = json.dumps(search_index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    print(f"Index size: {len(data) / 1024:.0f} KiB, {len(gzip.compress(data)) / 1024:.0f} KiB gzipped, "
+          f"{len(search_index['tokens'])} tokens")
+    
+    print("Python reference queries:")
+    for query in QUERIES:
+        matches = generate_pages.query_search_index(search_index, query)
+        print(f"  {query!r:20} {time_call(lambda: generate_pages.query_search_index(search_index, query), 20):8.3f} ms"
+              f"  {len(matches)} match(es)")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        search_index_path = Path(temp_dir) / 'search.json'
+        search_index_path.write_bytes(data)
+        node_results = benchmark_node(search_index_path)
+    if node_results is None:
+        print("node not found, skipping script.js queries")
+    else:
+        print("script.js queries (node):")
+        for query, (milliseconds, match_count) in node_results.items():
+            print(f"  {query!r:20} {milliseconds:8.3f} ms  {match_count} match(es)")
+
+if __name__ == '__main__':
+    main()
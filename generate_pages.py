@@ -1,98 +1,1645 @@
+import argparse
+import bisect
+import contextlib
+import cProfile
+import csv
+import glob
+import hashlib
+import heapq
+import html
 import json
 import os
+import posixpath
 import re
 import requests
-from pathlib import Path
-from PIL import Image
+from pathlib import Path, PurePosixPath
+from PIL import Image, features
 import io
+import itertools
 import unicodedata
-import shutil
+import string
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import urlparse
+from xml.etree import ElementTree
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import mimetypes
+import zlib
 
 
+HTTP_HEADERS = {
+    'User-Agent': 'UniversityLogoHistoryWiki/1.0 (https://github.com/yourusername/university-logo-website; your@email.com) Python/3.x'
+}
+
+# (connect, read) timeouts in seconds for every image request
+REQUEST_TIMEOUT = (10, 60)
+
+# Maximum number of simultaneous connections opened to any single host
+MAX_CONNECTIONS_PER_HOST = 4
+
+# Build instrumentation: timings and counters collected from every thread,
+# exported as a JSON report with --report.
+_stats = {'timings': {}, 'counters': {}, 'pages': {}}
+_stats_lock = threading.Lock()
+
+def count(name, amount=1):
+    """Add ``amount`` to the build counter ``name``."""
+    with _stats_lock:
+        _stats['counters'][name] = _stats['counters'].get(name, 0) + amount
+
+@contextlib.contextmanager
+def timed(name):
+    """Add the wall-clock time spent in the block to the timing ``name``.
+
+    Timings of work done on thread pools are summed over the threads, so
+    they can exceed the wall-clock time of the stage that ran them.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            timing = _stats['timings'].setdefault(name, {'seconds': 0.0, 'calls': 0})
+            timing['seconds'] += elapsed
+            timing['calls'] += 1
+
+def record_page_time(university_id, seconds):
+    """Record how long generating one university page took."""
+    with _stats_lock:
+        _stats['pages'][university_id] = seconds
+
+def reset_stats():
+    """Forget every timing and counter, before a new build."""
+    with _stats_lock:
+        for values in _stats.values():
+            values.clear()
+
+def get_build_report(wall_seconds):
+    """Return the timings and counters of the build as a JSON-serializable dict."""
+    with _stats_lock:
+        return {
+            'wallSeconds': round(wall_seconds, 6),
+            'timings': {
+                name: {'seconds': round(timing['seconds'], 6), 'calls': timing['calls']}
+                for name, timing in _stats['timings'].items()
+            },
+            'counters': dict(sorted(_stats['counters'].items())),
+            'pages': {
+                university_id: round(seconds, 6)
+                for university_id, seconds in sorted(_stats['pages'].items(), key=lambda item: -item[1])
+            },
+        }
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Return the shared HTTP session used for all image requests.
+
+    The session keeps connections alive between requests, caps the number of
+    connections per host and retries 429/5xx responses with exponential backoff.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=4,
+                backoff_factor=0.5,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=['HEAD', 'GET'],
+                respect_retry_after_header=True,
+            )
+            adapter = HTTPAdapter(
+                max_retries=retry,
+                pool_connections=100,
+                pool_maxsize=MAX_CONNECTIONS_PER_HOST,
+                pool_block=True,
+            )
+            session = requests.Session()
+            session.headers.update(HTTP_HEADERS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+# Persistent metadata about every image URL we have fetched: content type,
+# final URL after redirects, ETag/Last-Modified, extension and local path.
+URL_CACHE_PATH = Path('images/.url-cache.json')
+
+# Seconds between saves of the URL metadata cache during long downloads
+URL_CACHE_CHECKPOINT_INTERVAL = 30
+
+_url_cache = None
+_url_cache_lock = threading.Lock()
+
+# Format and intrinsic size of every image variants were made from, keyed
+# by content hash, so pages can be rendered without decoding (or, for SVGs,
+# rasterizing) images whose variants already exist
+IMAGE_INFO_PATH = Path('images/.image-info.json')
+
+_image_info = None
+
+CONTENT_TYPE_EXTENSIONS = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/jpg': '.jpg',
+    'image/gif': '.gif',
+    'image/svg+xml': '.svg',
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+}
+
+def get_url_metadata(url):
+    """Return the cached metadata for a URL (an empty dict if unknown)."""
+    global _url_cache
+    with _url_cache_lock:
+        if _url_cache is None:
+            try:
+                _url_cache = load_json_file(URL_CACHE_PATH)
+            except (FileNotFoundError, json.JSONDecodeError):
+                _url_cache = {}
+        return dict(_url_cache.get(url, {}))
+
+def update_url_metadata(url, **fields):
+    """Merge ``fields`` into the cached metadata for a URL."""
+    get_url_metadata(url)
+    with _url_cache_lock:
+        _url_cache.setdefault(url, {}).update(fields)
+
+def get_image_info(content_hash):
+    """Return the cached format and size of an image, or None if unknown."""
+    global _image_info
+    with _url_cache_lock:
+        if _image_info is None:
+            try:
+                _image_info = load_json_file(IMAGE_INFO_PATH)
+            except (FileNotFoundError, json.JSONDecodeError):
+                _image_info = {}
+        return _image_info.get(content_hash)
+
+def set_image_info(content_hash, info):
+    """Cache the format and size of an image."""
+    get_image_info(content_hash)
+    with _url_cache_lock:
+        _image_info[content_hash] = info
+
+def save_url_cache():
+    """Persist the URL metadata and image info caches next to the images."""
+    with _url_cache_lock:
+        if _url_cache is not None:
+            URL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            save_json_file(dict(sorted(_url_cache.items())), URL_CACHE_PATH)
+        if _image_info is not None:
+            IMAGE_INFO_PATH.parent.mkdir(parents=True, exist_ok=True)
+            save_json_file(dict(sorted(_image_info.items())), IMAGE_INFO_PATH)
+
+def sniff_image_extension(data):
+    """Guess an image file extension from its first bytes, or None."""
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return '.gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return '.avif'
+    head = data[:1024].lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if head.startswith((b'<svg', b'<?xml', b'<!doctype svg')) and b'<svg' in head:
+        return '.svg'
+    return None
+
+def get_default_extension(url):
+    """Extension to fall back on when an image type cannot be determined."""
+    # Default to .jpg for GitHub raw content
+    if 'raw.githubusercontent.com' in url:
+        return '.jpg'
+    return '.png'
+
 def get_file_extension(url):
-    """Determine the correct file extension for a given URL."""
+    """Determine the file extension for a URL without touching the network.
+
+    The extension comes from the URL path or, for extension-less URLs, from
+    the metadata cache. Returns None if it is only known after downloading.
+    """
     # First try to get extension from URL
     parsed_url = urlparse(url)
     file_extension = os.path.splitext(parsed_url.path)[1].lower()
+    if file_extension:
+        return file_extension
+    return get_url_metadata(url).get('extension')
+
+def find_existing_images(stem):
+    """Return the paths of images already saved at ``stem`` with any extension."""
+    stem = Path(stem)
+    if not stem.parent.is_dir():
+        return []
+    return [str(candidate) for candidate in sorted(stem.parent.glob(f'{glob.escape(stem.name)}.*'))
+            if candidate.suffix.lower() in CONTENT_TYPE_EXTENSIONS.values()]
+
+def find_existing_image(stem):
+    """Return the path of an image already saved at ``stem`` with any extension."""
+    existing_paths = find_existing_images(stem)
+    return existing_paths[0] if existing_paths else None
+
+def write_stream_atomically(output_path, chunks, verify=None):
+    """Write an iterable of byte chunks to ``output_path`` atomically.
+
+    The data goes to a temporary file in the same directory which is renamed
+    over the target once complete, so readers never see a partial file.
+    ``verify``, if given, is called with the temporary path before the
+    rename; if it raises, the target is left untouched.
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=output_path.parent, prefix=f'.{output_path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        if verify is not None:
+            verify(temp_path)
+        # mkstemp creates files readable only by their owner
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    count('files.written')
+
+# Downloads larger than this are not logos and are rejected
+MAX_IMAGE_BYTES = 50 * 1024 * 1024
+
+def verify_image(image_path, file_extension, expected_size=None):
+    """Check that a file holds a complete, decodable image; raise ValueError if not.
+
+    The file must be non-empty, at most ``MAX_IMAGE_BYTES`` and, when
+    ``expected_size`` (the Content-Length) is known, exactly that long.
+    SVGs must parse as XML with an <svg> root; other images must pass PIL's
+    integrity check and decode completely, unless this Pillow build cannot
+    read their format.
+    """
+    size = os.path.getsize(image_path)
+    if size == 0:
+        raise ValueError('empty image')
+    if size > MAX_IMAGE_BYTES:
+        raise ValueError(f'image too large ({size} bytes)')
+    if expected_size is not None and size != expected_size:
+        raise ValueError(f'truncated image ({size} of {expected_size} bytes)')
     
-    if not file_extension:
-        # Try to get extension from content type
+    file_extension = file_extension.lower()
+    if file_extension == '.svg':
         try:
-            response = requests.head(url)
-            content_type = response.headers.get('content-type', '').lower()
-            if 'image/png' in content_type:
-                file_extension = '.png'
-            elif 'image/jpeg' in content_type or 'image/jpg' in content_type:
-                file_extension = '.jpg'
-            elif 'image/gif' in content_type:
-                file_extension = '.gif'
-            elif 'image/svg+xml' in content_type:
-                file_extension = '.svg'
-            elif 'image/webp' in content_type:
-                file_extension = '.webp'
-            else:
-                # Default to .jpg for GitHub raw content
-                if 'raw.githubusercontent.com' in url:
-                    file_extension = '.jpg'
-                else:
-                    file_extension = '.png'
-        except Exception as e:
-            print(f"Error getting content type for {url}: {e}")
-            # Default to .jpg for GitHub raw content
-            if 'raw.githubusercontent.com' in url:
-                file_extension = '.jpg'
-            else:
-                file_extension = '.png'
+            root = ElementTree.parse(image_path).getroot()
+        except ElementTree.ParseError as e:
+            raise ValueError(f'invalid SVG: {e}')
+        if not root.tag.endswith('svg'):
+            raise ValueError(f'invalid SVG: root element is <{root.tag}>')
+        return
+    if file_extension in ('.avif', '.webp') and not features.check(file_extension[1:]):
+        return
+    try:
+        with Image.open(image_path) as image:
+            image.verify()
+        # verify() does not decode the pixel data (a truncated JPEG passes),
+        # so decode the whole image too; truncated images are never accepted
+        with Image.open(image_path) as image:
+            image.load()
+    except Exception as e:
+        raise ValueError(f'invalid image: {e}')
+
+def copy_file_atomically(source_path, output_path):
+    """Copy a file so that ``output_path`` is replaced in a single step."""
+    with open(source_path, 'rb') as f:
+        write_stream_atomically(output_path, iter(lambda: f.read(65536), b''))
+
+# Content-addressed store: every distinct image is kept once, named by the
+# SHA-256 of its bytes. The URL metadata cache doubles as the URL -> hash index.
+BLOB_DIR = Path('images/blobs')
+
+def get_blob_path(content_hash, file_extension):
+    """Return the blob store path for an image with the given hash."""
+    return BLOB_DIR / f'{content_hash}{file_extension}'
+
+def link_file(source_path, output_path):
+    """Make ``output_path`` a hardlink to ``source_path``, copying if links are unsupported."""
+    source_path, output_path = Path(source_path), Path(output_path)
+    if output_path.exists() and os.path.samefile(source_path, output_path):
+        return
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = output_path.with_name(f'.{output_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        copy_file_atomically(source_path, output_path)
+        return
+    os.replace(temp_path, output_path)
+
+def add_to_blob_store(url, image_path):
+    """Add an image file to the blob store and record its hash for ``url``.
+
+    Returns the blob path.
+    """
+    content_hash = hash_file(image_path)
+    file_extension = Path(image_path).suffix
+    blob_path = get_blob_path(content_hash, file_extension)
+    if not blob_path.exists():
+        link_file(image_path, blob_path)
+    update_url_metadata(url, hash=content_hash, extension=file_extension, path=blob_path.as_posix())
+    return blob_path.as_posix()
+
+def get_stored_blob(url):
+    """Return the blob path already stored for ``url``, or None."""
+    metadata = get_url_metadata(url)
+    if metadata.get('hash') and metadata.get('extension'):
+        blob_path = get_blob_path(metadata['hash'], metadata['extension'])
+        if blob_path.exists():
+            return blob_path.as_posix()
+    return None
+
+def prune_blob_store():
+    """Delete blobs that no URL in the metadata cache refers to any more."""
+    if not BLOB_DIR.is_dir():
+        return
+    with _url_cache_lock:
+        if _url_cache is None:
+            return
+        referenced = {metadata.get('hash') for metadata in _url_cache.values()}
+    for blob_path in BLOB_DIR.iterdir():
+        if blob_path.is_file() and blob_path.stem not in referenced:
+            blob_path.unlink()
+
+def save_image_response(url, response, stem, file_extension=None):
+    """Stream an image response to disk next to ``stem`` and store it as a blob.
+
+    The file extension is taken from ``file_extension`` if given, otherwise
+    sniffed from the downloaded bytes (falling back to the content type).
+    Returns the blob path.
+    """
+    chunks = response.iter_content(chunk_size=8192)
+    first_chunk = next(chunks, b'')
+    
+    content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+    if file_extension is None:
+        file_extension = (sniff_image_extension(first_chunk)
+                          or CONTENT_TYPE_EXTENSIONS.get(content_type)
+                          or get_default_extension(url))
+    
+    # The length can only be checked when the body isn't transfer-compressed
+    expected_size = None
+    if response.headers.get('content-length') and response.headers.get('content-encoding', 'identity') == 'identity':
+        expected_size = int(response.headers['content-length'])
+    
+    # Save the image, accepting it only once it is complete and decodable
+    output_path = f"{stem}{file_extension}"
+    write_stream_atomically(output_path, itertools.chain([first_chunk], chunks),
+                            verify=lambda temp_path: verify_image(temp_path, file_extension, expected_size))
+    count('http.bytesDownloaded', os.path.getsize(output_path))
     
-    return file_extension
+    update_url_metadata(
+        url,
+        contentType=content_type,
+        finalUrl=response.url,
+        etag=response.headers.get('etag'),
+        lastModified=response.headers.get('last-modified'),
+    )
+    return add_to_blob_store(url, output_path)
 
-def download_image(url, output_path):
-    """Download an image from a URL and save it to the specified path."""
+def download_image(url, stem, file_extension=None):
+    """Download an image from a URL and save it next to ``stem``.
+
+    Returns the blob path, or None if the download failed.
+    """
     try:
-        headers = {
-            'User-Agent': 'UniversityLogoHistoryWiki/1.0 (https://github.com/yourusername/university-logo-website; your@email.com) Python/3.x'
-        }
-        response = requests.get(url, stream=True, headers=headers)
-        response.raise_for_status()
-        
-        # Get the file extension
-        file_extension = get_file_extension(url)
-        
-        # Update output path with correct extension
-        output_path = str(Path(output_path).with_suffix(file_extension))
-        
-        # Create the directory if it doesn't exist
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Save the image
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        return output_path
+        count('http.requests')
+        with timed('http.download'):
+            response = get_session().get(url, stream=True, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            return save_image_response(url, response, stem, file_extension)
     except Exception as e:
+        count('http.errors')
         print(f"Error downloading image from {url}: {e}")
         return None
 
+def revalidate_image(url, stem):
+    """Re-fetch an image only if it changed upstream.
+
+    Sends a conditional GET using the stored ETag/Last-Modified values. On a
+    304 nothing is written; otherwise the new image is saved atomically and
+    stored as a blob. Returns (blob_path, changed), where ``changed`` is None
+    if the image could not be checked.
+    """
+    metadata = get_url_metadata(url)
+    headers = {}
+    if metadata.get('etag'):
+        headers['If-None-Match'] = metadata['etag']
+    if metadata.get('lastModified'):
+        headers['If-Modified-Since'] = metadata['lastModified']
+    
+    old_blob_path = get_stored_blob(url)
+    try:
+        count('http.requests')
+        with timed('http.revalidate'):
+            response = get_session().get(url, stream=True, timeout=REQUEST_TIMEOUT, headers=headers)
+            if response.status_code == 304:
+                count('http.notModified')
+                return old_blob_path, False
+            response.raise_for_status()
+            blob_path = save_image_response(url, response, stem)
+            return blob_path, blob_path != old_blob_path
+    except Exception as e:
+        count('http.errors')
+        print(f"Error revalidating image from {url}: {e}")
+        return old_blob_path, None
+
+def find_local_image(url, stem):
+    """Return the path of an image for ``url`` already saved at ``stem``, or None."""
+    file_extension = get_file_extension(url)
+    if file_extension:
+        image_path = Path(f"{stem}{file_extension}")
+        return str(image_path) if image_path.exists() else None
+    return find_existing_image(stem)
+
+def store_image(url, stems, revalidate=False):
+    """Make sure the image for ``url`` is in the blob store and linked at ``stems``.
+
+    The blob is looked up through the URL -> hash index first, so an image
+    shared by several pages is only ever fetched once. Files saved before the
+    blob store existed are adopted without a network request. Each stem gets
+    a hardlink to the blob so the per-university file names keep working.
+    Returns (blob_path, status); blob_path is None if the image is unavailable.
+    """
+    blob_path = get_stored_blob(url)
+    if blob_path is None:
+        # Adopt a copy already on disk from before the blob store existed
+        for stem in stems:
+            local_path = find_local_image(url, stem)
+            if not local_path:
+                continue
+            # A copy left by an interrupted build may be incomplete
+            try:
+                verify_image(local_path, Path(local_path).suffix)
+            except ValueError as e:
+                print(f"Discarding {local_path}: {e}")
+                os.unlink(local_path)
+                continue
+            blob_path = add_to_blob_store(url, local_path)
+            break
+    
+    if blob_path is None:
+        blob_path = download_image(url, stems[0], get_file_extension(url))
+        if blob_path is None:
+            count('images.failed')
+            return None, 'failed'
+        status = 'downloaded'
+    elif revalidate:
+        new_blob_path, changed = revalidate_image(url, stems[0])
+        if changed is None:
+            status = 'failed'
+        else:
+            blob_path = new_blob_path
+            status = 'changed' if changed else 'unchanged'
+    else:
+        status = 'cached'
+    
+    file_extension = Path(blob_path).suffix
+    for stem in stems:
+        image_path = Path(f"{stem}{file_extension}")
+        # Drop stale copies left behind if the image type changed
+        for existing_path in find_existing_images(stem):
+            if Path(existing_path) != image_path:
+                os.unlink(existing_path)
+        link_file(blob_path, image_path)
+    count(f'images.{status}')
+    return blob_path, status
+
+def get_current_logo_url(university_data):
+    """Return the URL of a university's current logo, or None."""
+    for logo in university_data['logoHistory']:
+        if logo.get('isCurrent', False):
+            return logo['imageUrl']
+    # If no current logo is marked, use the first logo
+    if university_data['logoHistory']:
+        return university_data['logoHistory'][0]['imageUrl']
+    return None
+
+def get_current_logo(institution_id, catalogue):
+    """Return the URL of an institution's current logo, or None."""
+    try:
+        return catalogue['currentLogos'][institution_id]
+    except KeyError:
+        print(f"Error getting logo for {institution_id}: not in the catalogue")
+    return None
+
+def get_image_jobs(university_id, university_data, catalogue):
+    """List every image a university page needs.
+
+    Returns (key, url, stem) tuples, where ``stem`` is the target path
+    without its file extension and ``key`` identifies the image on the page.
+    """
+    images_dir = Path('images') / university_id
+    jobs = []
+    
+    for logo in university_data['logoHistory']:
+        jobs.append((logo['year'], logo['imageUrl'], images_dir / f"{logo['year']}"))
+    
+    for occasion in university_data.get('specialOccasions', []):
+        stem = f"special_{occasion['year']}_{occasion['occasion'].lower().replace(' ', '_')}"
+        jobs.append((f"special_{occasion['year']}", occasion['imageUrl'], images_dir / stem))
+    
+    # Current logos of parent and predecessor institutions in our database
+    for relation, entries in (('parent', university_data.get('parentInstitutions', [])),
+                              ('predecessor', university_data.get('predecessors', []))):
+        for entry in entries:
+            related_id = find_university_id(catalogue, entry['name'])
+            if related_id is None:
+                continue
+            current_logo_url = get_current_logo(related_id, catalogue)
+            if current_logo_url:
+                key = f"{relation}_{related_id}"
+                jobs.append((key, current_logo_url, images_dir / key))
+    
+    return jobs
+
+def resolve_image(url, stem, fetched=None, use_placeholder=True):
+    """Return the local path of the image for ``url``, to be used by a page.
+
+    Images already resolved by ``fetch_images`` are looked up in ``fetched``,
+    including the ones it failed to get, which are not requested again;
+    otherwise the image is taken from the blob store, downloading it if
+    needed. When the image is unavailable the placeholder image is used if
+    there is one.
+    """
+    stem = str(stem)
+    if fetched is not None and stem in fetched:
+        blob_path = fetched[stem]
+    else:
+        blob_path, _ = store_image(url, [stem])
+    if blob_path:
+        return blob_path
+    
+    # Use the shared placeholder if the image is unavailable. It is not copied
+    # to the stem, where a later build would adopt it as the real image.
+    placeholder_path = Path('images/placeholder.png')
+    if use_placeholder and placeholder_path.exists():
+        return placeholder_path.as_posix()
+    return None
+
+def fetch_images(image_jobs, workers=8, revalidate=False):
+    """Download every image needed by a set of pages up front.
+
+    ``image_jobs`` is an iterable of (url, stem) pairs as produced by
+    ``get_image_jobs``. Images already in the blob store are found through
+    the URL -> hash index without any network request, unless ``revalidate``
+    is set, in which case they are checked upstream with a conditional GET.
+    Each remaining URL is requested once, concurrently across ``workers``
+    threads over the shared keep-alive session.
+
+    Returns (fetched, changed): a dict mapping each stem to its blob path,
+    or to None if the image could not be fetched, and the set of stems whose
+    image changed during revalidation.
+    """
+    targets_by_url = {}
+    for url, stem in image_jobs:
+        targets = targets_by_url.setdefault(url, [])
+        if str(stem) not in targets:
+            targets.append(str(stem))
+    
+    def fetch(url):
+        try:
+            return url, *store_image(url, targets_by_url[url], revalidate)
+        except Exception as e:
+            print(f"Error storing image from {url}: {e}")
+            return url, None, 'failed'
+    
+    fetched = {}
+    changed = set()
+    counts = {}
+    last_checkpoint = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for url, blob_path, status in executor.map(fetch, targets_by_url):
+            # Save progress regularly so an interrupted build keeps its downloads
+            if time.monotonic() - last_checkpoint > URL_CACHE_CHECKPOINT_INTERVAL:
+                save_url_cache()
+                last_checkpoint = time.monotonic()
+            counts[status] = counts.get(status, 0) + 1
+            if status == 'changed':
+                print(f"Image changed upstream: {url}")
+                changed.update(targets_by_url[url])
+            # Failures are recorded too, so that pages don't retry them
+            for stem in targets_by_url[url]:
+                fetched[stem] = blob_path
+    
+    summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"Resolved {len(targets_by_url)} unique image(s): {summary or 'none'}")
+    return fetched, changed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def parse_json(data):
+    """Parse JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 def load_json_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    with timed('json.load'):
+        return parse_json(Path(file_path).read_bytes())
 
 def save_json_file(data, file_path):
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    content = json.dumps(data, indent=2, ensure_ascii=False)
+    return write_if_changed(file_path, content)
+
+def hash_bytes(data):
+    """Return the SHA-256 hex digest of the given bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(file_path):
+    """Return the SHA-256 hex digest of a file, or None if it doesn't exist."""
+    digest = hashlib.sha256()
+    try:
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+def read_text_file(path):
+    """Read a text file as UTF-8, or UTF-16 if it starts with a byte order mark."""
+    data = Path(path).read_bytes()
+    if data[:2] in (b'\xff\xfe', b'\xfe\xff'):
+        return data.decode('utf-16')
+    return data.decode('utf-8-sig')
+
+def write_if_changed(file_path, content):
+    """Write text (or bytes) to a file only if it differs from what is already there.
+
+    Returns True if the file was written, which is done atomically. Leaving
+    identical files untouched keeps their mtimes (and any CDN caches keyed on
+    them) valid.
+    """
+    file_path = Path(file_path)
+    data = content if isinstance(content, bytes) else content.encode('utf-8')
+    if file_path.exists() and file_path.read_bytes() == data:
+        count('files.unchanged')
+        return False
+    write_stream_atomically(file_path, [data])
+    return True
+
+def spool_to_temp_file(directory, name, chunks):
+    """Stream text (or bytes) chunks to a new temporary file in ``directory``.
+
+    Returns (temp_path, content_hash). The caller renames or deletes the file.
+    """
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                data = chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+                digest.update(data)
+                f.write(data)
+        # mkstemp creates files readable only by their owner
+        os.chmod(temp_path, 0o644)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return temp_path, digest.hexdigest()
+
+def write_stream_if_changed(file_path, chunks):
+    """Write text (or bytes) chunks to a file only if the result differs from it.
+
+    Like ``write_if_changed``, but the content is never held in memory as a
+    whole: it is spooled to a temporary file next to the target while being
+    hashed, and only renamed over the target if the hashes differ.
+    Returns True if the file was written.
+    """
+    file_path = Path(file_path)
+    temp_path, content_hash = spool_to_temp_file(file_path.parent, file_path.name, chunks)
+    if content_hash == hash_file(file_path):
+        os.unlink(temp_path)
+        count('files.unchanged')
+        return False
+    os.replace(temp_path, file_path)
+    count('files.written')
+    return True
+
+def write_hashed_file(directory, prefix, chunks):
+    """Stream text chunks to ``<prefix>-<hash>.json`` in ``directory``.
+
+    The file is named after the first 12 hex digits of its content hash, so
+    an existing file with that name is identical and is left untouched.
+    Returns (file_name, content_hash).
+    """
+    temp_path, content_hash = spool_to_temp_file(directory, prefix, chunks)
+    file_name = f'{prefix}-{content_hash[:12]}.json'
+    if (Path(directory) / file_name).exists():
+        os.unlink(temp_path)
+        count('files.unchanged')
+    else:
+        os.replace(temp_path, Path(directory) / file_name)
+        count('files.written')
+    return file_name, content_hash
+
+# Bump this whenever the page rendering code changes so that incremental
+# builds know every page has to be re-rendered. Edits to the template files
+# are picked up automatically through their hash.
+TEMPLATE_VERSION = '6'
+
+MANIFEST_PATH = Path('.build-manifest.json')
+
+def load_manifest():
+    """Load the incremental build manifest, or an empty one."""
+    try:
+        manifest = load_json_file(MANIFEST_PATH)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'pages': {}}
+    manifest.setdefault('pages', {})
+    return manifest
+
+def get_related_ids(university_data):
+    """Return the IDs of the parent and predecessor records a page depends on."""
+    related = university_data.get('parentInstitutions', []) + university_data.get('predecessors', [])
+    return sorted({sanitize_id(entry['name']) for entry in related})
+
+def get_page_inputs(university_id, catalogue):
+    """Describe everything that goes into rendering a university page.
+
+    Besides the directly related records, the page depends on every record in
+    its lineage, whose names, years and relations its lineage section shows.
+    """
+    hashes = catalogue['hashes']
+    graph = catalogue['graph']
+    lineage_ids = {entry['id'] for _, entries in get_page_lineage(graph, university_id) for entry in entries}
+    return {
+        'input': hashes[university_id],
+        'deps': {
+            related_id: hashes.get(find_university_id(catalogue, related_id))
+            for related_id in catalogue['related'][university_id]
+        },
+        'lineage': {lineage_id: hashes[lineage_id] for lineage_id in sorted(lineage_ids)},
+        'template': f'{TEMPLATE_VERSION}:{get_template_hash()}',
+    }
+
+# Append-only log of the pages finished by the current build, one JSON object
+# per line, so that an interrupted build can be resumed with --resume
+JOURNAL_PATH = Path('.build-journal.jsonl')
+
+_journal_lock = threading.Lock()
+
+def load_journal():
+    """Read the pages an interrupted build completed from the journal.
+
+    Returns (entries, valid_size): the manifest entries by university ID and
+    the size of the journal up to the end of its last complete record. Lines
+    that are not complete records, such as one cut short by a crash, are
+    skipped.
+    """
+    entries = {}
+    valid_size = 0
+    position = 0
+    try:
+        with open(JOURNAL_PATH, 'rb') as f:
+            for line in f:
+                position += len(line)
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('incomplete line')
+                    record = json.loads(line)
+                    entries[record['id']] = record['page']
+                except (ValueError, KeyError, TypeError):
+                    continue
+                valid_size = position
+    except FileNotFoundError:
+        pass
+    return entries, valid_size
+
+def start_journal(resume=False):
+    """Open the build journal; returns (journal, completed).
+
+    When resuming, the entries of the interrupted build are kept and returned
+    as ``completed``, and anything after its last complete record is cut off
+    so that new records start on a line of their own; otherwise the journal
+    starts empty.
+    """
+    if not resume:
+        return open(JOURNAL_PATH, 'w', encoding='utf-8'), {}
+    completed, valid_size = load_journal()
+    journal = open(JOURNAL_PATH, 'a', encoding='utf-8')
+    journal.truncate(valid_size)
+    return journal, completed
+
+def record_in_journal(journal, university_id, manifest_entry):
+    """Append a finished page to the journal, flushing it to the OS right away."""
+    with _journal_lock:
+        journal.write(json.dumps({'id': university_id, 'page': manifest_entry}, ensure_ascii=False) + '\n')
+        journal.flush()
+
+def is_page_up_to_date(manifest_entry, page_inputs, output_file):
+    """Check whether a previously generated page can be reused as-is."""
+    if not manifest_entry:
+        return False
+    for key, value in page_inputs.items():
+        if manifest_entry.get(key) != value:
+            return False
+    # Regenerate if the page was deleted or edited by hand since the last build
+    return manifest_entry.get('output') == hash_file(output_file)
+
+def fold_text(text):
+    """Fold text to lowercase ASCII, dropping accents and other non-ASCII characters."""
+    # Normalize unicode characters and convert to ASCII
+    normalized = unicodedata.normalize('NFKD', text)
+    ascii_text = normalized.encode('ascii', 'ignore').decode('ascii')
+    return ascii_text.lower()
 
 def sanitize_id(name):
     """Sanitize university name to create a consistent ID."""
-    # Normalize unicode characters and convert to ASCII
-    normalized = unicodedata.normalize('NFKD', name)
-    ascii_name = normalized.encode('ascii', 'ignore').decode('ascii')
-    # Convert to lowercase and replace spaces with hyphens
-    return ascii_name.lower().replace(' ', '-')
+    # Convert to lowercase ASCII and replace spaces with hyphens
+    return fold_text(name).replace(' ', '-')
+
+def is_year(value):
+    """Check that a value can be used as a year, e.g. "1876" or 1876."""
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, str) and re.fullmatch(r'\d{1,4}', value) is not None)
+
+def is_url(value):
+    """Check that a value is an absolute http(s) URL."""
+    return isinstance(value, str) and urlparse(value).scheme in ('http', 'https') and bool(urlparse(value).netloc)
+
+# What each kind of field must look like, and how to describe it in errors
+FIELD_KINDS = {
+    'string': (lambda value: isinstance(value, str), 'a string'),
+    'name': (lambda value: isinstance(value, str) and value.strip() != '', 'a non-empty string'),
+    'year': (is_year, 'a year such as "1876"'),
+    'founded': (lambda value: isinstance(value, (str, int)) and not isinstance(value, bool), 'a string or number'),
+    'url': (is_url, 'an http(s) URL'),
+    'boolean': (lambda value: isinstance(value, bool), 'true or false'),
+    'object': (lambda value: isinstance(value, dict), 'an object'),
+    'list': (lambda value: isinstance(value, list), 'a list'),
+}
+
+def check_field(errors, record, key, path, kind, required=True):
+    """Check ``record[key]`` against a field kind, appending errors for ``path``.
+
+    Returns the value if it is present and valid, otherwise None.
+    """
+    field_path = f'{path}.{key}' if path else key
+    if key not in record:
+        if required:
+            errors.append(f'{field_path}: missing')
+        return None
+    is_valid, description = FIELD_KINDS[kind]
+    if not is_valid(record[key]):
+        errors.append(f'{field_path}: expected {description}, got {json.dumps(record[key], ensure_ascii=False)[:60]}')
+        return None
+    return record[key]
+
+def check_list(errors, record, key, fields, required=False):
+    """Check a list of objects, each with the given {key: kind} fields."""
+    entries = check_field(errors, record, key, '', 'list', required)
+    for number, entry in enumerate(entries or []):
+        entry_path = f'{key}[{number}]'
+        if not isinstance(entry, dict):
+            errors.append(f'{entry_path}: expected an object')
+            continue
+        for field, kind in fields.items():
+            # Flags such as isCurrent are optional
+            value = check_field(errors, entry, field, entry_path, kind, required=kind != 'boolean')
+            if field == 'source' and value is not None:
+                check_field(errors, value, 'url', f'{entry_path}.source', 'url')
+                check_field(errors, value, 'title', f'{entry_path}.source', 'string')
+
+def validate_university(university_data):
+    """Check a university record against the fields the generator relies on.
+
+    Returns a list of error messages, each starting with the path of the
+    offending field (such as ``logoHistory[2].imageUrl``); empty if valid.
+    """
+    if not isinstance(university_data, dict):
+        return ['expected an object']
+    
+    errors = []
+    university_id = check_field(errors, university_data, 'id', '', 'name', required=False)
+    if university_id is not None and ('/' in university_id or '\\' in university_id or university_id.startswith('.')):
+        errors.append(f'id: {university_id!r} cannot be used as a file name')
+    check_field(errors, university_data, 'name', '', 'name')
+    check_field(errors, university_data, 'founded', '', 'founded')
+    location = check_field(errors, university_data, 'location', '', 'object')
+    if location is not None:
+        check_field(errors, location, 'city', 'location', 'string')
+        check_field(errors, location, 'country', 'location', 'name')
+    
+    check_list(errors, university_data, 'logoHistory', {
+        'year': 'year', 'description': 'string', 'imageUrl': 'url', 'source': 'object',
+        'isCurrent': 'boolean', 'isEstimated': 'boolean',
+    }, required=True)
+    check_list(errors, university_data, 'specialOccasions', {
+        'year': 'year', 'occasion': 'name', 'description': 'string', 'imageUrl': 'url', 'source': 'object',
+        'isCurrent': 'boolean',
+    })
+    for key in ('parentInstitutions', 'predecessors'):
+        check_list(errors, university_data, key, {'name': 'name', 'year': 'year'})
+    return errors
+
+def load_university_file(json_file):
+    """Parse and validate a university JSON file.
+
+    Returns (university_id, university_data, content, changed), where
+    ``content`` is the record in the normalized form ``save_json_file``
+    writes and ``changed`` tells whether the file differs from it other than
+    in line endings. Raises ValueError listing every problem if the file is
+    not a valid record.
+    """
+    raw = Path(json_file).read_bytes()
+    try:
+        with timed('json.load'):
+            university_data = parse_json(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f'invalid JSON: {e}')
+    
+    errors = validate_university(university_data)
+    if errors:
+        raise ValueError('\n'.join(errors))
+    
+    # Use the sanitized ID from the JSON file
+    university_id = university_data.get('id', sanitize_id(university_data['name']))
+    content = json.dumps(university_data, indent=2, ensure_ascii=False)
+    # Files checked out with Windows line endings are not worth rewriting
+    return university_id, university_data, content, content.encode('utf-8') != raw.replace(b'\r\n', b'\n')
+
+def load_catalogue(json_dir='data/universities', keep_records=True, normalize=False):
+    """Parse every university JSON file once into an indexed in-memory catalogue.
+
+    The catalogue is a dict with:
+
+    - ``universities``: university ID -> record (None when not ``keep_records``)
+    - ``files``: university ID -> source JSON path
+    - ``hashes``: university ID -> hash of the record as saved by ``save_json_file``
+    - ``byName``: sanitized name -> university ID
+    - ``currentLogos``: university ID -> current logo URL (or None)
+    - ``related``: university ID -> sanitized names of its parents and predecessors
+    - ``relations``: university ID -> (relation, name, year) of its parents and
+      predecessors as written in the record
+    - ``entries``: university ID -> index projection (id, name, location, founded)
+    - ``collisions``: sanitized name -> IDs of the records it could refer to,
+      for names shared by several records (references resolve to the first)
+    - ``graph``: the parent/predecessor graph, see ``build_relationship_graph``
+
+    With ``keep_records`` unset, only this slim metadata is kept and full
+    records are re-read from disk by ``get_university`` when needed, so memory
+    does not grow with the size of the records. With ``normalize`` set, files
+    that are not in the normalized form their hash is computed from are
+    rewritten; all others are left untouched.
+
+    Files that cannot be parsed or fail validation are reported and left
+    out, as are records whose ID is already taken by an earlier file.
+    """
+    catalogue = {
+        'universities': {},
+        'files': {},
+        'hashes': {},
+        'byName': {},
+        'currentLogos': {},
+        'related': {},
+        'relations': {},
+        'entries': {},
+        'collisions': {},
+    }
+    
+    for json_file in sorted(Path(json_dir).glob('*.json')):
+        if json_file.name == 'index.json':
+            continue
+        
+        try:
+            university_id, university_data, content, changed = load_university_file(json_file)
+            if university_id in catalogue['files']:
+                raise ValueError(f"id {university_id!r} is already used by {catalogue['files'][university_id].name}")
+            if normalize and changed:
+                write_stream_atomically(json_file, [content.encode('utf-8')])
+                print(f"Normalized {json_file.name}")
+            add_catalogue_record(catalogue, university_id, json_file, university_data, content, keep_records)
+        except Exception as e:
+            for message in str(e).splitlines():
+                print(f"Error processing {json_file.name}: {message}")
+    
+    # Resolve names and parent/predecessor edges once every ID is known
+    index_catalogue_names(catalogue)
+    catalogue['graph'] = build_relationship_graph(catalogue)
+    report_catalogue_problems(catalogue)
+    return catalogue
+
+def add_catalogue_record(catalogue, university_id, json_file, university_data, content, keep_records=True):
+    """Add (or replace) one record in the per-university maps of the catalogue.
+
+    ``byName`` and the graph are not updated; call ``index_catalogue_names``
+    and ``build_relationship_graph`` once all records are in.
+    """
+    catalogue['universities'][university_id] = university_data if keep_records else None
+    catalogue['files'][university_id] = json_file
+    catalogue['hashes'][university_id] = hash_bytes(content.encode('utf-8'))
+    catalogue['currentLogos'][university_id] = get_current_logo_url(university_data)
+    catalogue['related'][university_id] = get_related_ids(university_data)
+    catalogue['relations'][university_id] = [
+        (relation, entry['name'], entry['year'])
+        for relation, entries in (('parent', university_data.get('parentInstitutions', [])),
+                                  ('predecessor', university_data.get('predecessors', [])))
+        for entry in entries
+    ]
+    catalogue['entries'][university_id] = {
+        'id': university_id,
+        'name': university_data['name'],
+        'location': university_data['location'],
+        'founded': university_data['founded'],
+    }
+
+def remove_catalogue_record(catalogue, university_id):
+    """Remove one record from the per-university maps of the catalogue."""
+    for key in ('universities', 'files', 'hashes', 'currentLogos', 'related', 'relations', 'entries'):
+        catalogue[key].pop(university_id, None)
+
+def index_catalogue_names(catalogue):
+    """Rebuild the name -> ID index and the list of name collisions.
+
+    When several records share a sanitized name, references to it resolve
+    to the first one in catalogue order.
+    """
+    catalogue['byName'] = {}
+    catalogue['collisions'] = {}
+    for university_id, entry in catalogue['entries'].items():
+        name_key = sanitize_id(entry['name'])
+        if name_key in catalogue['byName']:
+            catalogue['collisions'].setdefault(name_key, [catalogue['byName'][name_key]]).append(university_id)
+        else:
+            catalogue['byName'][name_key] = university_id
+    
+    # A name that sanitizes to another record's ID resolves to that record
+    for name_key, university_id in catalogue['byName'].items():
+        if name_key in catalogue['files'] and name_key != university_id:
+            catalogue['collisions'].setdefault(name_key, [name_key]).append(university_id)
+
+def report_catalogue_problems(catalogue):
+    """Print warnings about name collisions and parent or predecessor cycles."""
+    for name_key, university_ids in sorted(catalogue['collisions'].items()):
+        print(f"Warning: the name {name_key!r} is shared by {', '.join(university_ids)}; "
+              f"references to it resolve to {university_ids[0]}")
+    for cycle in catalogue['graph']['cycles']:
+        print(f"Warning: {cycle['relation']} cycle between {', '.join(cycle['ids'])}")
+
+def check_university_file(json_file):
+    """Validate one university file for ``check_catalogue``.
+
+    Returns (file name, university ID or None, errors, changed).
+    """
+    try:
+        university_id, _, _, changed = load_university_file(json_file)
+    except (OSError, ValueError) as e:
+        return json_file.name, None, str(e).splitlines(), False
+    return json_file.name, university_id, [], changed
+
+def check_catalogue(json_dir='data/universities', workers=None):
+    """Validate every university file without generating anything.
+
+    Files are parsed and validated in parallel on ``workers`` processes (one
+    per CPU by default). Duplicate IDs are reported as errors and files that
+    a build would reformat as notes. Returns the process exit code: 1 if any
+    file is invalid, 0 otherwise.
+    """
+    json_files = [json_file for json_file in sorted(Path(json_dir).glob('*.json')) if json_file.name != 'index.json']
+    owners = {}
+    error_count = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for name, university_id, errors, changed in executor.map(check_university_file, json_files, chunksize=32):
+            if university_id in owners:
+                errors.append(f'id {university_id!r} is already used by {owners[university_id]}')
+            elif university_id is not None:
+                owners[university_id] = name
+            for message in errors:
+                print(f"{name}: {message}")
+            if changed:
+                print(f"{name}: note: not normalized, a build with --normalize will reformat it")
+            error_count += len(errors)
+    
+    print(f"Checked {len(json_files)} file(s): {error_count} error(s)")
+    return 1 if error_count else 0
+
+def get_university(catalogue, university_id):
+    """Return the full record of a university, re-reading it if it wasn't kept."""
+    university_data = catalogue['universities'][university_id]
+    if university_data is None:
+        university_data = load_json_file(catalogue['files'][university_id])
+    return university_data
+
+def find_university_id(catalogue, name):
+    """Return the ID of the catalogue record for a university name, or None."""
+    candidate_id = sanitize_id(name)
+    if candidate_id in catalogue['universities']:
+        return candidate_id
+    return catalogue['byName'].get(candidate_id)
+
+# Edges followed upwards (towards ancestors) and downwards (towards descendants),
+# with the relation of the institution at the other end of each edge
+ANCESTOR_EDGES = (('parent', 'parents'), ('predecessor', 'predecessors'))
+DESCENDANT_EDGES = (('child', 'children'), ('successor', 'successors'))
+
+# Membership (parents and their member institutions) and succession
+# (predecessors and successors) are different kinds of relation, so lineages
+# follow one edge at a time and never cross from one kind into the other.
+# Pages list the walks in this order, ancestors first.
+LINEAGE_WALKS = [
+    ('Parent institutions', ('parent', 'parents')),
+    ('Predecessors', ('predecessor', 'predecessors')),
+    ('Member institutions', ('child', 'children')),
+    ('Successors', ('successor', 'successors')),
+]
+
+def build_relationship_graph(catalogue):
+    """Build the parent/predecessor graph of the whole catalogue in one pass.
+
+    The names in each record's ``relations`` are resolved with
+    ``find_university_id``; institutions without a record of their own are
+    left out. Returns a dict with:
+
+    - ``parents``, ``predecessors``: university ID -> [related ID, year] pairs
+    - ``children``, ``successors``: the same edges in the reverse direction
+    - ``order``: every ID, ancestors before their descendants (members of a
+      cycle are listed together)
+    - ``cycles``: dicts with the ``relation`` ('parent' or 'predecessor') and
+      the sorted ``ids`` of institutions that are their own ancestors through
+      that relation alone. A school that is both a member and a predecessor
+      of another is not a cycle.
+
+    Building the graph takes time linear in the number of records and edges.
+    """
+    graph = {'parents': {}, 'predecessors': {}, 'children': {}, 'successors': {}}
+    for university_id, relations in catalogue['relations'].items():
+        for relation, name, year in relations:
+            related_id = find_university_id(catalogue, name)
+            if related_id is None:
+                continue
+            forward, reverse = ('parents', 'children') if relation == 'parent' else ('predecessors', 'successors')
+            graph[forward].setdefault(university_id, []).append([related_id, year])
+            graph[reverse].setdefault(related_id, []).append([university_id, year])
+    
+    components = find_strongly_connected_components(
+        list(catalogue['files']),
+        lambda university_id: [descendant_id for _, key in DESCENDANT_EDGES
+                               for descendant_id, _ in graph[key].get(university_id, [])],
+    )
+    # Components come out with descendants first
+    components.reverse()
+    graph['order'] = [university_id for component in components for university_id in component]
+    graph['cycles'] = []
+    for (relation, key), (_, reverse_key) in zip(ANCESTOR_EDGES, DESCENDANT_EDGES):
+        components = find_strongly_connected_components(
+            list(catalogue['files']),
+            lambda university_id: [descendant_id for descendant_id, _ in graph[reverse_key].get(university_id, [])],
+        )
+        for component in reversed(components):
+            if len(component) > 1 or any(related_id == component[0] for related_id, _ in graph[key].get(component[0], [])):
+                graph['cycles'].append({'relation': relation, 'ids': sorted(component)})
+    return graph
+
+def find_strongly_connected_components(nodes, get_next):
+    """Split a directed graph into strongly connected components.
+
+    An iterative version of Tarjan's algorithm, linear in the size of the
+    graph. Components are returned in reverse topological order: a
+    component comes after every component it has edges to.
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+    
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(get_next(root)))]
+        while work:
+            node, next_nodes = work[-1]
+            for next_node in next_nodes:
+                if next_node not in index:
+                    index[next_node] = low[next_node] = len(index)
+                    stack.append(next_node)
+                    on_stack.add(next_node)
+                    work.append((next_node, iter(get_next(next_node))))
+                    break
+                if next_node in on_stack:
+                    low[node] = min(low[node], index[next_node])
+            else:
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+def get_lineage(graph, university_id, edges):
+    """Return every institution transitively related to a university, nearest first.
+
+    Follows the given (relation, graph key) ``edges`` breadth first, usually
+    a single one from ``LINEAGE_WALKS``, so each
+    institution is listed once, at its shortest distance. Each entry is a
+    dict with the ``id``, its ``relation`` to the institution ``via`` which
+    it was reached, the ``year`` of that relation and the ``generation``
+    (1 for direct relations). Cycles are safe, and the cost is proportional
+    to the size of the lineage rather than of the catalogue.
+    """
+    lineage = []
+    seen = {university_id}
+    frontier = [university_id]
+    generation = 0
+    while frontier:
+        generation += 1
+        next_frontier = []
+        for via_id in frontier:
+            for relation, key in edges:
+                for related_id, year in graph[key].get(via_id, []):
+                    if related_id in seen:
+                        continue
+                    seen.add(related_id)
+                    next_frontier.append(related_id)
+                    lineage.append({'id': related_id, 'relation': relation, 'via': via_id,
+                                    'year': year, 'generation': generation})
+        frontier = next_frontier
+    return lineage
+
+def get_page_lineage(graph, university_id):
+    """Return the lineage a university's page shows, as (title, entries) pairs.
+
+    Each of ``LINEAGE_WALKS`` is followed on its own. An institution is only
+    listed once, in the first walk that reaches it, so one that is both a
+    parent and a successor, say, is shown as an ancestor only. Walks with no
+    entries are left out.
+    """
+    shown = set()
+    walks = []
+    for title, edge in LINEAGE_WALKS:
+        entries = [entry for entry in get_lineage(graph, university_id, (edge,)) if entry['id'] not in shown]
+        shown.update(entry['id'] for entry in entries)
+        if entries:
+            walks.append((title, entries))
+    return walks
+
+# Resized and recompressed copies of the blobs, named <hash>-<width>w<ext>
+VARIANT_DIR = Path('images/variants')
+
+# Widths generated for each way a logo is shown, with the matching ``sizes``
+# attribute. Timeline logos are at most 300px wide (full width on mobile) and
+# parent/predecessor cards 200px; the larger widths serve high-DPI screens.
+IMAGE_ROLES = {
+    'display': {'widths': [300, 600], 'sizes': '(max-width: 768px) 100vw, 300px'},
+    'thumbnail': {'widths': [200, 400], 'sizes': '200px'},
+}
+
+# Modern formats offered through <picture>, if this Pillow build supports them
+MODERN_IMAGE_FORMATS = [
+    (name, file_extension, mime_type)
+    for name, file_extension, mime_type in (('AVIF', '.avif', 'image/avif'), ('WEBP', '.webp', 'image/webp'))
+    if features.check(name.lower())
+]
+
+# Width SVGs are rasterized at before being resized
+SVG_RASTER_WIDTH = 1200
+
+try:
+    import cairosvg
+except ImportError:
+    cairosvg = None
+
+def open_image(image_path):
+    """Open an image with PIL, rasterizing SVGs when cairosvg is installed.
+
+    Returns None for images that should be served untouched, such as
+    animated GIFs or SVGs that cannot be rasterized.
+    """
+    image_path = Path(image_path)
+    if image_path.suffix.lower() == '.svg':
+        if cairosvg is None:
+            return None
+        png_data = cairosvg.svg2png(url=str(image_path), output_width=SVG_RASTER_WIDTH)
+        return Image.open(io.BytesIO(png_data))
+    
+    image = Image.open(image_path)
+    if getattr(image, 'is_animated', False):
+        image.close()
+        return None
+    return image
+
+def save_image_variant(image, output_path, image_format):
+    """Encode an image in the given format and write it atomically."""
+    if image_format == 'JPEG':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+    
+    options = {
+        'PNG': {'optimize': True},
+        'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+        'WEBP': {'quality': 80, 'method': 6},
+        'AVIF': {'quality': 60},
+    }[image_format]
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    write_stream_atomically(output_path, [buffer.getvalue()])
+
+def build_image_variants(image_path, role, url_prefix='../'):
+    """Produce the resized variants of an image for one display role.
+
+    Variants are generated once per blob and width in the original format
+    (recompressed PNG or JPEG, or PNG for rasterized SVGs) and in every
+    supported modern format. Returns a dict with the fallback ``src``,
+    ``srcset``, ``width``/``height`` and a list of (mime_type, srcset)
+    ``sources``, or None if the image is served as is. Srcset URLs are
+    prefixed with ``url_prefix``, the path from the page to the site root.
+    
+    The format and size of each image are cached by content hash, so an
+    image is only opened (and an SVG only rasterized) when it is new or some
+    of its variants are missing.
+    """
+    image_path = Path(image_path)
+    content_hash = image_path.stem if image_path.parent == BLOB_DIR else hash_file(image_path)
+    image = None
+    info = get_image_info(content_hash)
+    try:
+        if info is None:
+            try:
+                image = open_image(image_path)
+            except Exception as e:
+                print(f"Error reading image {image_path}: {e}")
+                return None
+            if image is None:
+                return None
+            info = {'format': image.format, 'width': image.size[0], 'height': image.size[1]}
+            set_image_info(content_hash, info)
+        
+        fallback_format, fallback_extension = ('JPEG', '.jpg') if info['format'] == 'JPEG' else ('PNG', '.png')
+        formats = [(fallback_format, fallback_extension, None)] + MODERN_IMAGE_FORMATS
+        
+        # Never upscale: widths beyond the original collapse to its width
+        original_width, original_height = info['width'], info['height']
+        widths = sorted({min(width, original_width) for width in IMAGE_ROLES[role]['widths']})
+        
+        srcsets = {}
+        for width in widths:
+            height = max(1, round(original_height * width / original_width))
+            resized = None
+            for image_format, file_extension, mime_type in formats:
+                output_path = VARIANT_DIR / f'{content_hash}-{width}w{file_extension}'
+                if output_path.exists():
+                    count('variants.cached')
+                else:
+                    with timed('image.variants'):
+                        if image is None:
+                            image = open_image(image_path)
+                            if image is None:
+                                return None
+                        if resized is None:
+                            resized = image if width == original_width else image.resize((width, height), Image.LANCZOS)
+                        save_image_variant(resized, output_path, image_format)
+                    count('variants.encoded')
+                srcsets.setdefault(mime_type, []).append(f'{url_prefix}{output_path.as_posix()} {width}w')
+    finally:
+        if image is not None:
+            image.close()
+    
+    display_width = widths[0]
+    return {
+        'src': (VARIANT_DIR / f'{content_hash}-{display_width}w{fallback_extension}').as_posix(),
+        'srcset': ', '.join(srcsets[None]),
+        'width': display_width,
+        'height': max(1, round(original_height * display_width / original_width)),
+        'sources': [(mime_type, ', '.join(srcsets[mime_type])) for _, _, mime_type in MODERN_IMAGE_FORMATS],
+    }
+
+def get_average_color(image_path):
+    """Return the average colour of an image over white as a #rrggbb string."""
+    with Image.open(image_path) as image:
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        red, green, blue, _ = Image.alpha_composite(background, image).resize((1, 1), Image.BOX).getpixel((0, 0))
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+def get_index_logo(university_id, catalogue):
+    """Describe a university's current logo for its index entry.
+
+    Uses the same current-logo rule as the pages and only images already in
+    the blob store, so no network request is made. Returns a dict with the
+    thumbnail ``src`` and ``srcset``, its ``width``/``height`` and an average
+    ``color`` to show while it loads, or None if there is no local logo.
+    The result is cached in the URL metadata, keyed by the blob hash.
+    """
+    url = catalogue['currentLogos'].get(university_id)
+    blob_path = get_stored_blob(url) if url else None
+    if blob_path is None:
+        return None
+    
+    metadata = get_url_metadata(url)
+    cached = metadata.get('indexLogo')
+    if cached and cached.get('hash') == metadata['hash'] and Path(cached['logo']['src']).exists():
+        return cached['logo']
+    
+    variants = build_image_variants(blob_path, 'display', url_prefix='')
+    if variants is None:
+        logo = {'src': blob_path}
+    else:
+        logo = {
+            'src': variants['src'],
+            'srcset': variants['srcset'],
+            'width': variants['width'],
+            'height': variants['height'],
+            'color': get_average_color(variants['src']),
+        }
+    update_url_metadata(url, indexLogo={'hash': metadata['hash'], 'logo': logo})
+    return logo
+
+def render_picture(image_path, alt, role):
+    """Render the responsive <picture> (or plain <img>) markup for a logo."""
+    variants = build_image_variants(image_path, role)
+    if variants is None:
+        return render_template('image.html', src=Path(image_path).as_posix(), alt=alt)
+    
+    sizes = IMAGE_ROLES[role]['sizes']
+    sources = ''.join(
+        render_template('picture_source.html', type=mime_type, srcset=srcset, sizes=sizes)
+        for mime_type, srcset in variants['sources']
+    )
+    return render_template(
+        'picture.html',
+        sources=Markup(sources),
+        src=variants['src'],
+        srcset=variants['srcset'],
+        sizes=sizes,
+        width=variants['width'],
+        height=variants['height'],
+        alt=alt,
+    )
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / 'templates'
 
-def generate_university_page(university_id, university_data):
-    """Generate HTML page for a university."""
+_templates = {}
+_templates_lock = threading.Lock()
+
+class Markup(str):
+    """A string of HTML that is inserted into templates without escaping."""
+
+def escape(value):
+    """HTML-escape a value unless it is already ``Markup``."""
+    if isinstance(value, Markup):
+        return value
+    return Markup(html.escape(str(value), quote=True))
+
+def get_template(name):
+    """Return the compiled template ``name`` from the templates directory.
+
+    Templates are read and compiled once per process.
+    """
+    with _templates_lock:
+        if name not in _templates:
+            _templates[name] = string.Template((TEMPLATE_DIR / name).read_text(encoding='utf-8'))
+        return _templates[name]
+
+def clear_template_cache():
+    """Forget compiled templates so they are re-read on next use."""
+    with _templates_lock:
+        _templates.clear()
+
+def get_template_hash():
+    """Return a hash of all template files, used to invalidate generated pages."""
+    with _templates_lock:
+        if '__hash__' not in _templates:
+            digest = hashlib.sha256()
+            for template_path in sorted(TEMPLATE_DIR.glob('*.html')):
+                digest.update(template_path.name.encode('utf-8'))
+                digest.update(template_path.read_bytes())
+            _templates['__hash__'] = digest.hexdigest()
+        return _templates['__hash__']
+
+def render_template(template_name, **context):
+    """Render a template, HTML-escaping every value that isn't ``Markup``."""
+    return Markup(get_template(template_name).substitute({key: escape(value) for key, value in context.items()}))
+
+def iter_template(template_name, **context):
+    """Render a template piece by piece for streaming it to a file.
+
+    Produces the same text as ``render_template``, except that list and
+    iterator values are emitted item by item (each escaped unless it is
+    ``Markup``), so long sections never have to be joined into one string.
+    """
+    template = get_template(template_name)
+    text = template.template
+    position = 0
+    for match in template.pattern.finditer(text):
+        yield text[position:match.start()]
+        position = match.end()
+        if match.group('escaped') is not None:
+            yield template.delimiter
+            continue
+        name = match.group('named') or match.group('braced')
+        if name is None:
+            raise ValueError(f'Invalid placeholder in template {template_name}')
+        value = context[name]
+        for item in (value if isinstance(value, (list, Iterator)) else [value]):
+            yield escape(item)
+    yield text[position:]
+
+def render_related_entry(entry, catalogue, logos, entry_class, prefix, year_label, link_text):
+    """Render a parent or predecessor institution card.
+
+    Institutions in our database link to their page and show their current
+    logo when it is available in ``logos``.
+    """
+    related_id = find_university_id(catalogue, entry['name'])
+    link = ''
+    logo = ''
+    if related_id is not None:
+        link = render_template('related_link.html', related_id=related_id, prefix=prefix, link_text=link_text)
+        if related_id in logos:
+            logo = render_template(
+                'related_logo.html',
+                prefix=prefix,
+                image_path=Path(logos[related_id]).as_posix(),
+                picture=render_picture(logos[related_id], f"Current logo of {entry['name']}", 'thumbnail'),
+            )
+    return render_template(
+        'related_entry.html',
+        entry_class=entry_class,
+        prefix=prefix,
+        name=entry['name'],
+        year_label=year_label,
+        year=entry['year'],
+        link=link,
+        logo=logo,
+    )
+
+LINEAGE_RELATIONS = {
+    'parent': 'Parent institution',
+    'predecessor': 'Predecessor',
+    'child': 'Member institution',
+    'successor': 'Successor',
+}
+
+def render_lineage_section(university_id, catalogue):
+    """Render the membership and succession lineages of a university.
+
+    See ``get_page_lineage``. The section is left out when it would only
+    repeat the parent and predecessor cards, i.e. when there are no
+    descendants and no indirect ancestors.
+    """
+    walks = get_page_lineage(catalogue['graph'], university_id)
+    if all(entry['relation'] in ('parent', 'predecessor') and entry['generation'] == 1
+           for _, lineage in walks for entry in lineage):
+        return ''
+    
+    lists = []
+    for title, lineage in walks:
+        entries = ''.join(
+            render_template(
+                'lineage_entry.html',
+                generation=entry['generation'],
+                related_id=entry['id'],
+                name=catalogue['entries'][entry['id']]['name'],
+                relation=LINEAGE_RELATIONS[entry['relation']],
+                via=catalogue['entries'][entry['via']]['name'],
+                year=entry['year'],
+            )
+            for entry in lineage
+        )
+        lists.append(render_template('lineage_list.html', title=title, entries=Markup(entries)))
+    return render_template('lineage.html', lists=Markup(''.join(lists)))
+
+def generate_university_page(university_id, university_data, catalogue, fetched=None):
+    """Generate HTML page for a university.
+
+    ``catalogue`` is the result of ``load_catalogue`` and is used to resolve
+    parent and predecessor institutions. ``fetched`` optionally maps image
+    stems to paths already downloaded by ``fetch_images``.
+    """
     # Create images directory for this university
     images_dir = Path('images') / university_id
     images_dir.mkdir(parents=True, exist_ok=True)
@@ -104,67 +1651,19 @@ def generate_university_page(university_id, university_data):
     parent_logos = {}
     predecessor_logos = {}
     
-    # Function to get current logo for an institution
-    def get_current_logo(institution_id):
-        try:
-            institution_data = load_json_file(f'data/universities/{institution_id}.json')
-            for logo in institution_data['logoHistory']:
-                if logo.get('isCurrent', False):
-                    return logo['imageUrl']
-            # If no current logo is marked, use the first logo
-            if institution_data['logoHistory']:
-                return institution_data['logoHistory'][0]['imageUrl']
-        except Exception as e:
-            print(f"Error getting logo for {institution_id}: {e}")
-        return None
-
-    # Download and save images for regular logos
-    for logo in university_data['logoHistory']:
-        image_url = logo['imageUrl']
-        # Get file extension
-        file_extension = get_file_extension(image_url)
-        
-        # Create image filename using year
-        image_filename = f"{logo['year']}{file_extension}"
-        image_path = images_dir / image_filename
-        
-        # Download image if it doesn't exist
-        if not image_path.exists():
-            downloaded_path = download_image(image_url, str(image_path))
-            if downloaded_path:
-                downloaded_images[logo['year']] = downloaded_path
-            else:
-                # Use placeholder if download fails
-                placeholder_path = Path('images/placeholder.png')
-                if placeholder_path.exists():
-                    shutil.copy(str(placeholder_path), str(image_path))
-                    downloaded_images[logo['year']] = str(image_path)
-        else:
-            downloaded_images[logo['year']] = str(image_path)
-    
-    # Download and save images for special occasions
-    for occasion in university_data.get('specialOccasions', []):
-        image_url = occasion['imageUrl']
-        # Get file extension
-        file_extension = get_file_extension(image_url)
-        
-        # Create image filename using year and occasion
-        image_filename = f"special_{occasion['year']}_{occasion['occasion'].lower().replace(' ', '_')}{file_extension}"
-        image_path = images_dir / image_filename
-        
-        # Download image if it doesn't exist
-        if not image_path.exists():
-            downloaded_path = download_image(image_url, str(image_path))
-            if downloaded_path:
-                downloaded_images[f"special_{occasion['year']}"] = downloaded_path
-            else:
-                # Use placeholder if download fails
-                placeholder_path = Path('images/placeholder.png')
-                if placeholder_path.exists():
-                    shutil.copy(str(placeholder_path), str(image_path))
-                    downloaded_images[f"special_{occasion['year']}"] = str(image_path)
+    for key, image_url, stem in get_image_jobs(university_id, university_data, catalogue):
+        if key.startswith('parent_'):
+            image_path = resolve_image(image_url, stem, fetched, use_placeholder=False)
+            if image_path:
+                parent_logos[key[len('parent_'):]] = image_path
+        elif key.startswith('predecessor_'):
+            image_path = resolve_image(image_url, stem, fetched, use_placeholder=False)
+            if image_path:
+                predecessor_logos[key[len('predecessor_'):]] = image_path
         else:
-            downloaded_images[f"special_{occasion['year']}"] = str(image_path)
+            image_path = resolve_image(image_url, stem, fetched)
+            if image_path:
+                downloaded_images[key] = image_path
     
     # Sort logo history by year (newest first), handling estimated dates
     sorted_history = sorted(university_data['logoHistory'], 
@@ -186,365 +1685,1357 @@ def generate_university_page(university_id, university_data):
                           key=lambda x: int(x['year']),
                           reverse=True)
     
-    logo_entries = []
-    for logo in sorted_history:
-        estimated_mark = ' <span class="estimated-date">(estimated)</span>' if logo.get('isEstimated', False) else ''
-        current_mark = ' <span class="current-logo">(Current)</span>' if logo.get('isCurrent', False) else ''
-        
-        # Get the image path relative to the root directory
-        image_path = downloaded_images[logo['year']]
-        relative_path = f"images/{university_id}/{Path(image_path).name}"
-        
-        logo_entries.append(f'''
-            <div class="logo-entry">
-                <a href="{relative_path}" target="_blank" class="logo-image-link">
-                    <img src="{relative_path}" 
-                         alt="{university_data['name']} logo from {logo['year']}" 
-                         class="logo-image">
-                </a>
-                <div class="logo-details">
-                    <h3>{logo['year']}{estimated_mark}{current_mark}</h3>
-                    <p>{logo['description']}</p>
-                    <a href="{logo['source']['url']}" 
-                       target="_blank" 
-                       class="source-link" 
-                       rel="noopener noreferrer">
-                        Source: {logo['source']['title']}
-                    </a>
-                </div>
-            </div>
-        ''')
-    
-    # Add special occasions section if there are any
-    if sorted_occasions:
-        logo_entries.append('<h2 class="special-occasions-title">Special Occasions</h2>')
-        for occasion in sorted_occasions:
-            current_mark = ' <span class="current-logo">(Current)</span>' if occasion.get('isCurrent', False) else ''
-            
-            # Get the image path relative to the root directory
-            image_path = downloaded_images[f"special_{occasion['year']}"]
-            relative_path = f"images/{university_id}/{Path(image_path).name}"
+    def iter_logo_entries():
+        for logo in sorted_history:
+            estimated_mark = ' <span class="estimated-date">(estimated)</span>' if logo.get('isEstimated', False) else ''
+            current_mark = ' <span class="current-logo">(Current)</span>' if logo.get('isCurrent', False) else ''
             
-            logo_entries.append(f'''
-                <div class="logo-entry special-occasion">
-                    <a href="{relative_path}" target="_blank" class="logo-image-link">
-                        <img src="{relative_path}" 
-                             alt="{university_data['name']} {occasion['occasion']} logo from {occasion['year']}" 
-                             class="logo-image">
-                    </a>
-                    <div class="logo-details">
-                        <h3>{occasion['year']} - {occasion['occasion']}{current_mark}</h3>
-                        <p>{occasion['description']}</p>
-                        <a href="{occasion['source']['url']}" 
-                           target="_blank" 
-                           class="source-link" 
-                           rel="noopener noreferrer">
-                            Source: {occasion['source']['title']}
-                        </a>
-                    </div>
-                </div>
-            ''')
-
+            yield render_template(
+                'logo_entry.html',
+                entry_class='logo-entry',
+                image_path=Path(downloaded_images[logo['year']]).as_posix(),
+                picture=render_picture(downloaded_images[logo['year']],
+                                       f"{university_data['name']} logo from {logo['year']}", 'display'),
+                title=Markup(f"{escape(logo['year'])}{estimated_mark}{current_mark}"),
+                description=logo['description'],
+                source_url=logo['source']['url'],
+                source_title=logo['source']['title'],
+            )
+        
+        # Add special occasions section if there are any
+        if sorted_occasions:
+            yield Markup('\n            <h2 class="special-occasions-title">Special Occasions</h2>')
+            for occasion in sorted_occasions:
+                current_mark = ' <span class="current-logo">(Current)</span>' if occasion.get('isCurrent', False) else ''
+                
+                yield render_template(
+                    'logo_entry.html',
+                    entry_class='logo-entry special-occasion',
+                    image_path=Path(downloaded_images[f"special_{occasion['year']}"]).as_posix(),
+                    picture=render_picture(downloaded_images[f"special_{occasion['year']}"],
+                                           f"{university_data['name']} {occasion['occasion']} logo from {occasion['year']}",
+                                           'display'),
+                    title=Markup(f"{escape(occasion['year'])} - {escape(occasion['occasion'])}{current_mark}"),
+                    description=occasion['description'],
+                    source_url=occasion['source']['url'],
+                    source_title=occasion['source']['title'],
+                )
+    
     # Add predecessors section if there are any
-    predecessor_entries = []
-    if sorted_predecessors:
-        predecessor_entries.append('<h2 class="predecessors-title">Predecessor Universities</h2>')
-        for predecessor in sorted_predecessors:
-            # Check if predecessor university exists in our database
-            predecessor_id = sanitize_id(predecessor['name'])
-            predecessor_json_path = Path('data/universities') / f'{predecessor_id}.json'
-            
-            if predecessor_json_path.exists():
-                # Get current logo for predecessor
-                current_logo_url = get_current_logo(predecessor_id)
-                if current_logo_url:
-                    # Download and save the logo
-                    file_extension = get_file_extension(current_logo_url)
-                    image_filename = f"predecessor_{predecessor_id}{file_extension}"
-                    image_path = images_dir / image_filename
-                    
-                    if not image_path.exists():
-                        downloaded_path = download_image(current_logo_url, str(image_path))
-                        if downloaded_path:
-                            predecessor_logos[predecessor_id] = downloaded_path
-                    else:
-                        predecessor_logos[predecessor_id] = str(image_path)
-                    
-                    relative_path = f"images/{university_id}/{Path(predecessor_logos[predecessor_id]).name}"
-                    
-                    # Predecessor exists, create a link to its page with logo
-                    predecessor_entries.append(f'''
-                        <div class="predecessor-entry">
-                            <div class="predecessor-info">
-                                <h3>{predecessor['name']}</h3>
-                                <p>Merged/Acquired: {predecessor['year']}</p>
-                                <a href="universities/{predecessor_id}.html" class="predecessor-link">
-                                    View Predecessor University →
-                                </a>
-                            </div>
-                            <div class="predecessor-logo">
-                                <a href="{relative_path}" target="_blank" class="logo-image-link">
-                                    <img src="{relative_path}" 
-                                         alt="Current logo of {predecessor['name']}" 
-                                         class="logo-image">
-                                </a>
-                            </div>
-                        </div>
-                    ''')
-                else:
-                    # Predecessor exists but no logo found
-                    predecessor_entries.append(f'''
-                        <div class="predecessor-entry">
-                            <div class="predecessor-info">
-                                <h3>{predecessor['name']}</h3>
-                                <p>Merged/Acquired: {predecessor['year']}</p>
-                                <a href="universities/{predecessor_id}.html" class="predecessor-link">
-                                    View Predecessor University →
-                                </a>
-                            </div>
-                        </div>
-                    ''')
-            else:
-                # Predecessor doesn't exist in our database
-                predecessor_entries.append(f'''
-                    <div class="predecessor-entry">
-                        <div class="predecessor-info">
-                            <h3>{predecessor['name']}</h3>
-                            <p>Merged/Acquired: {predecessor['year']}</p>
-                        </div>
-                    </div>
-                ''')
-
+    def iter_predecessor_entries():
+        if sorted_predecessors:
+            yield Markup('\n        <h2 class="predecessors-title">Predecessor Universities</h2>')
+            for predecessor in sorted_predecessors:
+                yield render_related_entry(
+                    predecessor, catalogue, predecessor_logos,
+                    entry_class='predecessor-entry', prefix='predecessor',
+                    year_label='Merged/Acquired', link_text='View Predecessor University',
+                )
+    
     # Add parent institutions section if there are any
-    parent_entries = []
-    if sorted_parents:
-        parent_entries.append('<h2 class="parent-institutions-title">Parent Institutions</h2>')
-        for parent in sorted_parents:
-            # Check if parent institution exists in our database
-            parent_id = sanitize_id(parent['name'])
-            parent_json_path = Path('data/universities') / f'{parent_id}.json'
-            
-            if parent_json_path.exists():
-                # Get current logo for parent
-                current_logo_url = get_current_logo(parent_id)
-                if current_logo_url:
-                    # Download and save the logo
-                    file_extension = get_file_extension(current_logo_url)
-                    image_filename = f"parent_{parent_id}{file_extension}"
-                    image_path = images_dir / image_filename
-                    
-                    if not image_path.exists():
-                        downloaded_path = download_image(current_logo_url, str(image_path))
-                        if downloaded_path:
-                            parent_logos[parent_id] = downloaded_path
-                    else:
-                        parent_logos[parent_id] = str(image_path)
-                    
-                    relative_path = f"images/{university_id}/{Path(parent_logos[parent_id]).name}"
-                    
-                    # Parent exists, create a link to its page with logo
-                    parent_entries.append(f'''
-                        <div class="parent-institution-entry">
-                            <div class="parent-info">
-                                <h3>{parent['name']}</h3>
-                                <p>Year: {parent['year']}</p>
-                                <a href="universities/{parent_id}.html" class="parent-link">
-                                    View Parent Institution →
-                                </a>
-                            </div>
-                            <div class="parent-logo">
-                                <a href="{relative_path}" target="_blank" class="logo-image-link">
-                                    <img src="{relative_path}" 
-                                         alt="Current logo of {parent['name']}" 
-                                         class="logo-image">
-                                </a>
-                            </div>
-                        </div>
-                    ''')
-                else:
-                    # Parent exists but no logo found
-                    parent_entries.append(f'''
-                        <div class="parent-institution-entry">
-                            <div class="parent-info">
-                                <h3>{parent['name']}</h3>
-                                <p>Year: {parent['year']}</p>
-                                <a href="universities/{parent_id}.html" class="parent-link">
-                                    View Parent Institution →
-                                </a>
-                            </div>
-                        </div>
-                    ''')
-            else:
-                # Parent doesn't exist in our database
-                parent_entries.append(f'''
-                    <div class="parent-institution-entry">
-                        <div class="parent-info">
-                            <h3>{parent['name']}</h3>
-                            <p>Year: {parent['year']}</p>
-                        </div>
-                    </div>
-                ''')
-
-    page_content = f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{university_data['name']} - Logo History</title>
-    <link rel="stylesheet" href="styles.css">
-    <link rel="stylesheet" href="university.css">
-    <style>
-        .predecessor-entry,
-        .parent-institution-entry {{
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            gap: 2rem;
-            padding: 1.5rem;
-            background: #f8f9fa;
-            border-radius: 8px;
-            margin-bottom: 1rem;
-        }}
-        
-        .predecessor-info,
-        .parent-info {{
-            flex: 1;
-        }}
-        
-        .predecessor-logo,
-        .parent-logo {{
-            flex: 0 0 200px;
-        }}
-        
-        .predecessor-logo img,
-        .parent-logo img {{
-            max-width: 100%;
-            height: auto;
-            border-radius: 4px;
-        }}
-        
-        @media (max-width: 768px) {{
-            .predecessor-entry,
-            .parent-institution-entry {{
-                flex-direction: column;
-                gap: 1rem;
-            }}
-            
-            .predecessor-logo,
-            .parent-logo {{
-                flex: 0 0 auto;
-                width: 100%;
-                max-width: 200px;
-                margin: 0 auto;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <header>
-        <h1>{university_data['name']}</h1>
-        <p>Logo History and Evolution</p>
-    </header>
-
-    <main class="university-page">
-        <div class="navigation-buttons">
-            <a href="index.html" class="nav-button">← Back to Universities</a>
-            <a href="edit.html?id={university_id}" class="nav-button">Edit Entry</a>
-        </div>
-
-        <div class="university-info">
-            <h2>University Information</h2>
-            <div class="info-grid">
-                <div class="info-item">
-                    <h3>Location</h3>
-                    <p>{university_data['location']['city']}, {university_data['location']['country']}</p>
-                </div>
-                <div class="info-item">
-                    <h3>Founded</h3>
-                    <p>{university_data['founded']}</p>
-                </div>
-            </div>
-        </div>
-
-        {''.join(parent_entries)}
-
-        {''.join(predecessor_entries)}
-
-        <div class="logo-history">
-            <h2>Logo History</h2>
-            {''.join(logo_entries)}
-        </div>
-    </main>
-
-    <footer>
-        <p>© 2024 University Logo History Wiki</p>
-    </footer>
-</body>
-</html>'''
-
+    def iter_parent_entries():
+        if sorted_parents:
+            yield Markup('\n        <h2 class="parent-institutions-title">Parent Institutions</h2>')
+            for parent in sorted_parents:
+                yield render_related_entry(
+                    parent, catalogue, parent_logos,
+                    entry_class='parent-institution-entry', prefix='parent',
+                    year_label='Year', link_text='View Parent Institution',
+                )
+    
+    # Entries are rendered as the page is streamed to disk
+    page_chunks = iter_template(
+        'university.html',
+        name=university_data['name'],
+        university_id=university_id,
+        city=university_data['location']['city'],
+        country=university_data['location']['country'],
+        founded=university_data['founded'],
+        parent_entries=iter_parent_entries(),
+        predecessor_entries=iter_predecessor_entries(),
+        lineage_section=render_lineage_section(university_id, catalogue),
+        logo_entries=iter_logo_entries(),
+    )
+    
     # Write the page content to a file
     output_dir = Path('universities')
     output_dir.mkdir(exist_ok=True)
     output_file = output_dir / f'{university_id}.html'
-    output_file.write_text(page_content, encoding='utf-8')
+    write_stream_if_changed(output_file, page_chunks)
     print(f'Generated page for {university_data["name"]}')
+    return output_file
+
+# Sharded catalogue index for the front page: a small manifest plus one
+# content-hashed shard per country that can be cached forever.
+INDEX_DIR = Path('data/index')
+INDEX_MANIFEST_PATH = INDEX_DIR / 'manifest.json'
+INDEX_SHARD_DIR = INDEX_DIR / 'shards'
+
+# Number of universities embedded in the manifest to render the first screen
+FIRST_SCREEN_SIZE = 24
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def get_shard_id(country):
+    """Return a filesystem-safe shard name for a country."""
+    return re.sub(r'[^a-z0-9]+', '-', sanitize_id(country)).strip('-') or 'unknown'
 
-def update_index_json(universities_data):
-    # Create index data with IDs based on university names
-    index_data = {
-        "universities": [
-            {
-                "id": uni["id"],
-                "name": uni["name"],
-                "location": uni["location"],
-                "founded": uni["founded"]
-            }
-            for uni in universities_data
-        ]
+def iter_compressed(file_path, compress, flush):
+    """Compress a file block by block with a compressor's ``compress``/``flush`` methods."""
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            yield compress(block)
+    yield flush()
+
+def write_compressed_copies(file_path):
+    """Write pre-compressed .gz (and .br, if brotli is installed) siblings of a file."""
+    file_path = Path(file_path)
+    # A gzip wrapper without a timestamp keeps the output identical for identical input
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    write_stream_if_changed(f'{file_path}.gz', iter_compressed(file_path, compressor.compress, compressor.flush))
+    if brotli is not None:
+        compressor = brotli.Compressor()
+        write_stream_if_changed(f'{file_path}.br', iter_compressed(file_path, compressor.process, compressor.finish))
+
+# Index entries held in memory per sorted run when sorting in streaming mode
+INDEX_SORT_RUN_SIZE = 10000
+
+def iter_sort_run(run_path):
+    """Read back the entries of a sorted run written by ``external_sort``."""
+    with open(run_path, encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+@contextlib.contextmanager
+def external_sort(entries, key, run_size=None):
+    """Sort index entries, spilling sorted runs to disk if ``run_size`` is set.
+
+    Yields a function returning a fresh iterator over the sorted entries, so
+    they can be read more than once. Without ``run_size`` the entries are
+    sorted in memory. Otherwise at most ``run_size`` entries are held at a
+    time: each run is sorted and written to a temporary JSON-lines file, and
+    the runs are merged lazily with ``heapq.merge``, which like ``sorted``
+    keeps entries with equal keys in their original order.
+    """
+    if run_size is None:
+        items = sorted(entries, key=key)
+        yield lambda: iter(items)
+        return
+    
+    entries = iter(entries)
+    with tempfile.TemporaryDirectory(prefix='index-sort-') as temp_dir:
+        run_paths = []
+        for run in iter(lambda: list(itertools.islice(entries, run_size)), []):
+            run.sort(key=key)
+            run_path = Path(temp_dir) / f'run-{len(run_paths)}.jsonl'
+            with open(run_path, 'w', encoding='utf-8') as f:
+                for entry in run:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            run_paths.append(run_path)
+        yield lambda: heapq.merge(*(iter_sort_run(run_path) for run_path in run_paths), key=key)
+
+def get_search_tokens(text):
+    """Split text into accent-folded search tokens, as the front page does."""
+    return re.findall(r'[a-z0-9]+', fold_text(text))
+
+def build_search_index(entries):
+    """Build the prebuilt search index for the front page.
+
+    ``entries`` are the index entries sorted by name; documents are numbered
+    in that order. The index holds:
+
+    - ``ids``: document number -> university ID
+    - ``tokens``: sorted list of every distinct name, city and country token
+    - ``postings``: for each token, the sorted document numbers containing it
+    - ``countries``: country facets as [country, count] pairs
+    - ``docCountries``: document number -> index into ``countries``
+
+    Because ``tokens`` is sorted, a prefix query is a binary search for the
+    range of tokens starting with it followed by a union of their postings.
+    """
+    ids = []
+    postings = {}
+    # Countries are numbered as they are first seen, then renumbered in sorted order
+    seen_countries = {}
+    doc_countries = []
+    for doc, entry in enumerate(entries):
+        location = entry['location']
+        for field in (entry['name'], location.get('city', ''), location['country']):
+            for token in get_search_tokens(field):
+                doc_list = postings.setdefault(token, [])
+                if not doc_list or doc_list[-1] != doc:
+                    doc_list.append(doc)
+        ids.append(entry['id'])
+        doc_countries.append(seen_countries.setdefault(location['country'], len(seen_countries)))
+    
+    countries = sorted(seen_countries)
+    renumber = [0] * len(countries)
+    for number, country in enumerate(countries):
+        renumber[seen_countries[country]] = number
+    country_counts = [0] * len(countries)
+    for doc, country_number in enumerate(doc_countries):
+        doc_countries[doc] = renumber[country_number]
+        country_counts[doc_countries[doc]] += 1
+    
+    tokens = sorted(postings)
+    return {
+        'ids': ids,
+        'tokens': tokens,
+        'postings': [postings[token] for token in tokens],
+        'countries': [[country, count] for country, count in zip(countries, country_counts)],
+        'docCountries': doc_countries,
     }
+
+def query_search_index(search_index, query, country=None):
+    """Return the IDs of the universities matching a query, in index order.
+
+    Every query token must be a prefix of some token of the university's
+    name, city or country. This mirrors ``searchUniversities`` in script.js
+    and exists for testing and benchmarking the index.
+    """
+    terms = get_search_tokens(query)[:255]
+    tokens = search_index['tokens']
+    country_number = next((number for number, (name, _) in enumerate(search_index['countries'])
+                           if name == country), -1)
+    
+    if not terms:
+        matches = range(len(search_index['ids']))
+    else:
+        # counts[doc] is the number of leading terms the document has matched so far
+        counts = bytearray(len(search_index['ids']))
+        matches = []
+        for term_number, term in enumerate(terms):
+            start = bisect.bisect_left(tokens, term)
+            end = bisect.bisect_left(tokens, term + '\x7f', start)
+            for position in range(start, end):
+                for doc in search_index['postings'][position]:
+                    if counts[doc] == term_number:
+                        counts[doc] = term_number + 1
+                        if term_number == len(terms) - 1:
+                            matches.append(doc)
+        matches.sort()
+    
+    return [
+        search_index['ids'][doc]
+        for doc in matches
+        if country is None or search_index['docCountries'][doc] == country_number
+    ]
+
+def iter_shard(country, entries):
+    """Serialize a country shard entry by entry, as compact JSON."""
+    yield '{"country":' + json.dumps(country, ensure_ascii=False) + ',"universities":['
+    separator = ''
+    for entry in entries:
+        yield separator + json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+        separator = ','
+    yield ']}'
+
+def write_sharded_index(iter_entries, compress=False, run_size=None):
+    """Write the per-country index shards, search index and top-level manifest.
+
+    ``iter_entries`` returns a fresh iterator over the index entries sorted
+    by name; the entries are streamed rather than held in memory, except for
+    the search index, whose postings cover the whole catalogue. ``run_size``
+    is passed on to ``external_sort`` when grouping the entries by country.
+
+    Shard file names carry a hash of their content, so they never change once
+    published; only the small manifest has to be revalidated by browsers.
+    Shards that are no longer referenced are deleted.
+    """
+    INDEX_SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    countries = []
+    shard_files = set()
+    
+    def add_shard_file(shard_name):
+        shard_files.add(shard_name)
+        if compress:
+            write_compressed_copies(INDEX_SHARD_DIR / shard_name)
+            shard_files.update({f'{shard_name}.gz', f'{shard_name}.br'})
+    
+    # Sorting by country is stable, so each shard stays sorted by name
+    country_key = lambda entry: entry['location']['country']
+    with external_sort(iter_entries(), country_key, run_size) as iter_by_country:
+        for country, country_entries in itertools.groupby(iter_by_country(), key=country_key):
+            shard = {'country': country, 'count': 0}
+            def iter_counted(entries):
+                for entry in entries:
+                    shard['count'] += 1
+                    yield entry
+            shard_name, content_hash = write_hashed_file(INDEX_SHARD_DIR, get_shard_id(country),
+                                                         iter_shard(country, iter_counted(country_entries)))
+            add_shard_file(shard_name)
+            shard.update({'shard': f'shards/{shard_name}', 'hash': content_hash})
+            countries.append(shard)
+    
+    # The search index is content-hashed like the shards
+    first = []
+    def iter_search_entries():
+        for entry in iter_entries():
+            if len(first) < FIRST_SCREEN_SIZE:
+                first.append(entry)
+            yield entry
+    content = json.dumps(build_search_index(iter_search_entries()), ensure_ascii=False, separators=(',', ':'))
+    search_name, search_hash = write_hashed_file(INDEX_SHARD_DIR, 'search', [content])
+    add_shard_file(search_name)
+    
+    manifest = {
+        'total': sum(country['count'] for country in countries),
+        'countries': countries,
+        'search': {'path': f'shards/{search_name}', 'hash': search_hash},
+        'first': first,
+    }
+    content = json.dumps(manifest, ensure_ascii=False, separators=(',', ':'))
+    written = write_if_changed(INDEX_MANIFEST_PATH, content)
+    if compress:
+        write_compressed_copies(INDEX_MANIFEST_PATH)
+    
+    # Remove shards from previous builds
+    for shard_path in INDEX_SHARD_DIR.iterdir():
+        if shard_path.name not in shard_files:
+            shard_path.unlink()
+    
+    return written
+
+def iter_index_json(entries):
+    """Serialize index.json entry by entry, exactly as ``save_json_file`` would."""
+    yield '{\n  "universities": ['
+    separator = '\n'
+    for entry in entries:
+        yield separator + '    ' + json.dumps(entry, indent=2, ensure_ascii=False).replace('\n', '\n    ')
+        separator = ',\n'
+    yield ']\n}' if separator == '\n' else '\n  ]\n}'
+
+def update_index_json(catalogue, compress=False, stream=False):
+    """Write index.json and the sharded index from the catalogue's index entries.
+
+    In ``stream`` mode the entries are sorted with an on-disk merge sort
+    instead of in memory, so only ``INDEX_SORT_RUN_SIZE`` of them (with their
+    logos) are held at once.
+    """
+    def iter_entries():
+        for university_id, entry in catalogue['entries'].items():
+            entry = dict(entry)
+            # Resolve the current logo now so the front page needs no extra requests
+            try:
+                logo = get_index_logo(university_id, catalogue)
+            except Exception as e:
+                print(f"Error preparing index logo for {university_id}: {str(e)}")
+                logo = None
+            if logo:
+                entry["logo"] = logo
+            yield entry
     
     # Sort universities by name
-    index_data["universities"].sort(key=lambda x: x["name"])
+    run_size = INDEX_SORT_RUN_SIZE if stream else None
+    with external_sort(iter_entries(), lambda x: x["name"], run_size) as iter_sorted_entries:
+        # Save index.json
+        if write_stream_if_changed("data/universities/index.json", iter_index_json(iter_sorted_entries())):
+            print("Updated index.json")
+        else:
+            print("index.json is up to date")
+        
+        # Save the sharded index used by the front page
+        if write_sharded_index(iter_sorted_entries, compress, run_size):
+            shard_count = len({entry['location']['country'] for entry in catalogue['entries'].values()})
+            print(f"Updated sharded index ({shard_count} shard(s))")
+
+LINEAGE_PATH = Path('data/lineage.json')
+
+def write_lineage_json(catalogue):
+    """Write the whole parent/predecessor graph to data/lineage.json.
+
+    Lists every university with its direct relations in both directions,
+    plus the topological ``order``, any ``cycles`` (within one relation)
+    and name ``collisions``, so other tools can walk lineages without
+    re-resolving names.
+    """
+    graph = catalogue['graph']
+    lineage = {
+        'order': graph['order'],
+        'cycles': graph['cycles'],
+        'collisions': catalogue['collisions'],
+        'universities': {
+            university_id: dict(
+                name=catalogue['entries'][university_id]['name'],
+                **{key: [{'id': related_id, 'year': year} for related_id, year in graph[key].get(university_id, [])]
+                   for _, key in ANCESTOR_EDGES + DESCENDANT_EDGES},
+            )
+            for university_id in catalogue['files']
+        },
+    }
+    if save_json_file(lineage, LINEAGE_PATH):
+        print("Updated lineage.json")
+
+# Deployment bundle written by --dist. Pages and the JSON data the front end
+# fetches by name keep their paths; every other asset is published under a
+# name carrying its content hash, so it can be cached for good.
+DIST_STATE_PATH = Path('.dist-state.json')
+DIST_MANIFEST_NAME = 'asset-manifest.json'
+DIST_SOURCE_FILES = [('.', ('.html', '.css', '.js')), ('universities', ('.html',)), ('images', None), ('data', None)]
+DIST_IMMUTABLE_DIRS = [BLOB_DIR, VARIANT_DIR, INDEX_SHARD_DIR]
+COMPRESSIBLE_EXTENSIONS = {'.html', '.css', '.js', '.json', '.svg', '.txt'}
+
+HTML_REFERENCE = re.compile(r'\b(href|src|srcset)="([^"]*)"')
+HTML_RAW_ELEMENT = re.compile(r'<(pre|textarea|script)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+HTML_COMMENT = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+SCRIPT_STRING = re.compile(r'''(['"`])([\w./-]+)\1''')
+
+def get_dist_sources():
+    """Yield (path, kind) for every file that goes into the bundle.
+
+    ``kind`` is 'page' (minified, references rewritten), 'script'
+    (references rewritten, fingerprinted), 'fixed' (copied as is) or 'asset'
+    (copied under a fingerprinted name). Hidden, temporary and pre-compressed
+    files are left out, as are the per-university image links, which no page
+    refers to; compressed copies are made for the bundle itself.
+    """
+    for directory, extensions in DIST_SOURCE_FILES:
+        directory = Path(directory)
+        if not directory.is_dir():
+            continue
+        paths = directory.glob('*') if directory == Path('.') else directory.rglob('*')
+        for path in sorted(paths):
+            if not path.is_file() or any(part.startswith('.') for part in path.parts):
+                continue
+            if path.suffix in ('.gz', '.br', '.tmp') or (extensions and path.suffix not in extensions):
+                continue
+            # Pages link images through the blob store and its variants; the
+            # per-university links to the same blobs are not published
+            if path.parts[0] == 'images' and path.parent not in (Path('images'), BLOB_DIR, VARIANT_DIR):
+                continue
+            if path.suffix == '.html':
+                yield path, 'page'
+            elif path.suffix == '.js':
+                yield path, 'script'
+            elif path.parts[0] == 'data' or any(path.parent == parent for parent in DIST_IMMUTABLE_DIRS):
+                # Content-addressed names, and data fetched by fixed URLs
+                yield path, 'fixed'
+            else:
+                yield path, 'asset'
+
+def get_fingerprinted_path(path, content_hash):
+    """Return ``dir/name.<hash>.ext`` for a file with the given content hash."""
+    path = PurePosixPath(path)
+    return path.with_name(f'{path.stem}.{content_hash[:10]}{path.suffix}').as_posix()
+
+def rewrite_url(url, base_dir, assets):
+    """Point a relative URL at the fingerprinted copy of its target, if it has one."""
+    parsed = urlparse(url)
+    if parsed.scheme or parsed.netloc or not parsed.path or parsed.path.startswith('/'):
+        return url
+    path = posixpath.normpath(posixpath.join(base_dir, parsed.path))
+    if path not in assets:
+        return url
+    return posixpath.relpath(assets[path], base_dir or '.') + url[len(parsed.path):]
+
+def rewrite_html_references(content, base_dir, assets):
+    """Rewrite href, src and srcset attributes that point at fingerprinted assets."""
+    def replace(match):
+        attribute, value = match.groups()
+        if attribute == 'srcset':
+            candidates = []
+            for candidate in value.split(','):
+                url, *descriptor = candidate.split()
+                candidates.append(' '.join([rewrite_url(url, base_dir, assets)] + descriptor))
+            value = ', '.join(candidates)
+        else:
+            value = rewrite_url(value, base_dir, assets)
+        return f'{attribute}="{value}"'
+    return HTML_REFERENCE.sub(replace, content)
+
+def rewrite_script_references(content, base_dir, assets):
+    """Rewrite string literals in a script that name a fingerprinted asset."""
+    def replace(match):
+        quote, url = match.groups()
+        return f'{quote}{rewrite_url(url, base_dir, assets)}{quote}'
+    return SCRIPT_STRING.sub(replace, content)
+
+def minify_html(content):
+    """Drop comments and collapse whitespace runs to a single space or newline.
+
+    <pre>, <textarea> and <script> elements are left untouched.
+    """
+    def collapse(text):
+        text = HTML_COMMENT.sub('', text)
+        return re.sub(r'\s+', lambda match: '\n' if '\n' in match.group() else ' ', text)
+    
+    output = []
+    position = 0
+    for match in HTML_RAW_ELEMENT.finditer(content):
+        output.append(collapse(content[position:match.start()]))
+        output.append(match.group())
+        position = match.end()
+    output.append(collapse(content[position:]))
+    return ''.join(output).strip() + '\n'
+
+# Directories holding the site's sources, which a bundle must never be written into
+DIST_FORBIDDEN_DIRS = [Path('data'), Path('images'), Path('universities'), TEMPLATE_DIR]
+
+def check_dist_dir(dist_dir):
+    """Raise ValueError if ``dist_dir`` would overlap the site's own files.
+
+    The bundle deletes stale files from its directory, so it cannot be the
+    site root, one of its ancestors or a directory inside the sources.
+    """
+    dist_path = Path(dist_dir).resolve()
+    root = Path.cwd().resolve()
+    if root == dist_path or dist_path in root.parents:
+        raise ValueError(f"--dist {dist_dir}: the bundle cannot contain the site itself")
+    for source_dir in DIST_FORBIDDEN_DIRS:
+        source_dir = source_dir.resolve()
+        if dist_path == source_dir or source_dir in dist_path.parents:
+            raise ValueError(f"--dist {dist_dir}: the bundle cannot be inside {source_dir}")
+
+def get_previous_dist_files(dist_dir, state):
+    """Return the files an earlier bundle of ``dist_dir`` published, as relative paths.
+
+    They are taken from the bundle state and the earlier asset manifest, and
+    include the compressed siblings of each file.
+    """
+    outputs = {entry['output'] for entry in state['files'].values()}
+    try:
+        manifest = load_json_file(dist_dir / DIST_MANIFEST_NAME)
+        outputs.update(manifest.get('assets', {}).values())
+        outputs.update(manifest.get('immutable', []))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return {path for output in outputs for path in (output, f'{output}.gz', f'{output}.br')}
+
+def load_dist_state(dist_dir):
+    """Load what the last bundle of ``dist_dir`` was made from, or an empty state."""
+    try:
+        state = load_json_file(DIST_STATE_PATH)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+    if state.get('dist') != dist_dir.as_posix():
+        return {'dist': dist_dir.as_posix(), 'files': {}}
+    return state
+
+def build_dist(dist_dir):
+    """Bundle the built site into ``dist_dir`` for deployment.
+
+    Assets are fingerprinted, the references to them in pages and scripts
+    rewritten, pages minified (and saved as UTF-8) and compressible files
+    given .gz (and .br, if brotli is installed) siblings.
+    ``asset-manifest.json`` maps source paths to published ones and lists the
+    files that may be cached forever.
+
+    Sources whose size and mtime match the last bundle are not re-hashed, and
+    outputs are only rewritten and re-compressed when their content changed.
+    Files an earlier bundle published that this one does not are deleted;
+    nothing else in ``dist_dir`` is touched.
+    """
+    check_dist_dir(dist_dir)
+    dist_dir = Path(dist_dir)
+    state = load_dist_state(dist_dir)
+    previous_files = get_previous_dist_files(dist_dir, state)
+    files = {}
+    assets = {}
+    published = set()
+    immutable = []
+    updated = 0
+    
+    def get_source_hash(source, previous):
+        stat = source.stat()
+        if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime_ns:
+            count('dist.cached')
+            return previous['hash'], stat
+        count('dist.hashed')
+        return hash_file(source), stat
+    
+    def publish(output, written):
+        nonlocal updated
+        published.add(output)
+        target = dist_dir / output
+        if PurePosixPath(output).suffix in COMPRESSIBLE_EXTENSIONS:
+            published.update({f'{output}.gz', f'{output}.br'})
+            if written or not Path(f'{target}.gz').exists():
+                write_compressed_copies(target)
+        if written:
+            updated += 1
+    
+    sources = list(get_dist_sources())
+    
+    # Copied files first, so the map of fingerprinted names is complete
+    # before pages and scripts are rewritten against it
+    for source, kind in sources:
+        if kind not in ('asset', 'fixed'):
+            continue
+        key = source.as_posix()
+        previous = state['files'].get(key)
+        content_hash, stat = get_source_hash(source, previous)
+        output = get_fingerprinted_path(key, content_hash) if kind == 'asset' else key
+        target = dist_dir / output
+        written = not (previous and previous['hash'] == content_hash and previous['output'] == output
+                       and target.exists())
+        if written:
+            link_file(source, target)
+        publish(output, written)
+        files[key] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': content_hash, 'output': output}
+        if kind == 'asset':
+            assets[key] = output
+        if kind == 'asset' or any(source.parent == parent for parent in DIST_IMMUTABLE_DIRS):
+            immutable.append(output)
+    
+    # Scripts are fingerprinted after rewriting, then pages are rewritten
+    # against the assets and scripts. Either is only redone when its source
+    # or the names it may refer to changed.
+    for rewritten_kind in ('script', 'page'):
+        assets_hash = hash_bytes(json.dumps(assets, sort_keys=True).encode('utf-8'))
+        for source, kind in sources:
+            if kind != rewritten_kind:
+                continue
+            key = source.as_posix()
+            previous = state['files'].get(key)
+            content_hash, stat = get_source_hash(source, previous)
+            if (previous and previous['hash'] == content_hash and previous.get('assets') == assets_hash
+                    and (dist_dir / previous['output']).exists()):
+                output = previous['output']
+                written = False
+            else:
+                base_dir = posixpath.dirname(key)
+                content = read_text_file(source)
+                if kind == 'page':
+                    output = key
+                    content = minify_html(rewrite_html_references(content, base_dir, assets))
+                else:
+                    content = rewrite_script_references(content, base_dir, assets)
+                    output = get_fingerprinted_path(key, hash_bytes(content.encode('utf-8')))
+                written = write_if_changed(dist_dir / output, content)
+            publish(output, written)
+            files[key] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': content_hash,
+                          'output': output, 'assets': assets_hash}
+            if kind == 'script':
+                immutable.append(output)
+        if rewritten_kind == 'script':
+            assets.update({key: entry['output'] for key, entry in files.items() if key.endswith('.js')})
+    
+    manifest = {'assets': dict(sorted(assets.items())), 'immutable': sorted(immutable)}
+    save_json_file(manifest, dist_dir / DIST_MANIFEST_NAME)
+    published.add(DIST_MANIFEST_NAME)
+    
+    # Remove files from earlier bundles, such as assets under old hashes
+    removed = 0
+    dist_root = dist_dir.resolve()
+    for output in sorted(previous_files - published):
+        path = dist_dir / output
+        if dist_root in path.resolve().parents and path.is_file():
+            path.unlink()
+            removed += 1
     
-    # Save index.json
-    save_json_file(index_data, "data/universities/index.json")
-    print("Updated index.json")
+    save_json_file({'dist': dist_dir.as_posix(), 'files': files}, DIST_STATE_PATH)
+    count('dist.updated', updated)
+    count('dist.removed', removed)
+    print(f"Bundled {len(files)} file(s) into {dist_dir}: {updated} updated, {removed} removed")
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the University Logo History pages.')
+    parser.add_argument('command', nargs='?', choices=['build', 'serve', 'import', 'export'], default='build',
+                        help='build the site once (default), serve it locally and rebuild on changes, '
+                             'or import or export university records in bulk')
+    parser.add_argument('path', nargs='?', default='-',
+                        help='file to import from or export to (default: standard input/output)')
+    parser.add_argument('--format', choices=['ndjson', 'csv'],
+                        help='format of the import/export file (default: from its name, else ndjson)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-render pages whose inputs changed since the last build')
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help='number of pages to generate concurrently (default: 1)')
+    parser.add_argument('--revalidate', action='store_true',
+                        help='check cached images upstream with conditional requests and refresh changed ones')
+    parser.add_argument('--download-workers', type=int, default=8,
+                        help='number of images to download concurrently (default: 8)')
+    parser.add_argument('--compress-index', action='store_true',
+                        help='also write gzip (and brotli, if installed) copies of the sharded index')
+    parser.add_argument('--dist', nargs='?', const='dist', metavar='DIR',
+                        help='also bundle the site for deployment into DIR (default: dist), with '
+                             'fingerprinted, pre-compressed assets and minified pages')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted build, skipping the pages it already finished')
+    parser.add_argument('--stream', action='store_true',
+                        help='keep only slim metadata in memory and sort the index on disk, for very large catalogues')
+    parser.add_argument('--normalize', action='store_true',
+                        help='rewrite university files that are not formatted like the generator writes them')
+    parser.add_argument('--check', action='store_true',
+                        help='only validate data/universities, on --jobs processes (default: one per CPU)')
+    parser.add_argument('--host', default='127.0.0.1', help='address the dev server listens on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='port the dev server listens on (default: 8000)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write per-stage and per-page timings and build counters to FILE as JSON')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='run the build under cProfile and dump the stats to FILE (main thread only)')
+    return parser.parse_args(argv)
+
+def build_page(university_id, catalogue, page_inputs, fetched=None, journal=None):
+    """Generate one page and return its manifest entry, recording it in ``journal``."""
+    start = time.perf_counter()
+    try:
+        with timed('page.build'):
+            university_data = get_university(catalogue, university_id)
+            output_file = generate_university_page(university_id, university_data, catalogue, fetched)
+            manifest_entry = dict(page_inputs, output=hash_file(output_file))
+        if journal is not None:
+            record_in_journal(journal, university_id, manifest_entry)
+        return manifest_entry
+    finally:
+        record_page_time(university_id, time.perf_counter() - start)
+
+def build_pages(pending, catalogue, jobs=1, fetched=None, journal=None):
+    """Generate pages for (university_id, page_inputs) pairs.
+
+    Pages are built on a thread pool when jobs > 1, since the work is
+    dominated by image downloads. A failing page does not stop the others.
+    Each finished page is recorded in ``journal`` as soon as it is written.
+    Returns (manifest_entries, errors), both in the order of ``pending``.
+    """
+    results = {}
+    errors = []
+    
+    if jobs > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [(university_id, executor.submit(build_page, university_id, catalogue, page_inputs,
+                                                          fetched, journal))
+                       for university_id, page_inputs in pending]
+            for university_id, future in futures:
+                try:
+                    results[university_id] = future.result()
+                except Exception as e:
+                    errors.append((university_id, e))
+    else:
+        for university_id, page_inputs in pending:
+            try:
+                results[university_id] = build_page(university_id, catalogue, page_inputs, fetched, journal)
+            except Exception as e:
+                errors.append((university_id, e))
+    
+    return results, errors
+
+def build(args, catalogue=None):
+    """Run a full or incremental build; returns the process exit code.
+
+    The catalogue is loaded from data/universities unless one is given.
+    """
+    # Refuse a bundle directory that overlaps the site before doing any work
+    if args.dist:
+        try:
+            check_dist_dir(args.dist)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return 1
+    
     # Create necessary directories
     universities_dir = Path('universities')
     images_dir = Path('images')
     universities_dir.mkdir(exist_ok=True)
     images_dir.mkdir(exist_ok=True)
     
-    # Get all JSON files from data/universities
-    json_dir = Path('data/universities')
-    universities_data = []
+    # Parse every JSON file from data/universities once. Source records are
+    # only reformatted on request; their hashes ignore formatting anyway.
+    # When streaming, full records are re-read from disk as each page needs them.
+    with timed('stage.load'):
+        if catalogue is None:
+            catalogue = load_catalogue('data/universities', keep_records=not args.stream, normalize=args.normalize)
     
-    for json_file in json_dir.glob('*.json'):
-        if json_file.name == 'index.json':
-            continue
+    # Previous build state, consulted only in incremental mode, and the pages
+    # an interrupted build already finished, consulted only when resuming
+    with timed('stage.plan'):
+        manifest = load_manifest()
+        journal, completed = start_journal(resume=args.resume)
+        new_manifest = {'pages': {}}
+        pending = []
+        resumed = 0
+        
+        for university_id in catalogue['universities']:
+            page_inputs = get_page_inputs(university_id, catalogue)
+            output_file = universities_dir / f'{university_id}.html'
+            previous_entry = manifest['pages'].get(university_id)
             
+            if args.incremental and is_page_up_to_date(previous_entry, page_inputs, output_file):
+                new_manifest['pages'][university_id] = previous_entry
+            elif is_page_up_to_date(completed.get(university_id), page_inputs, output_file):
+                new_manifest['pages'][university_id] = completed[university_id]
+                resumed += 1
+            else:
+                pending.append((university_id, page_inputs))
+        if args.resume:
+            print(f"Resuming: {resumed} page(s) already built by the interrupted build")
+    
+    # Download every image the pending pages need in one concurrent pass.
+    # When revalidating, every page's images are checked upstream and pages
+    # whose images changed are rebuilt.
+    with timed('stage.images'):
+        image_jobs = []
+        stem_owners = {}
+        pending_ids = {university_id for university_id, _ in pending}
+        for university_id in catalogue['universities']:
+            if not args.revalidate and university_id not in pending_ids:
+                continue
+            try:
+                for _, url, stem in get_image_jobs(university_id, get_university(catalogue, university_id), catalogue):
+                    image_jobs.append((url, stem))
+                    stem_owners[str(stem)] = university_id
+            except Exception as e:
+                print(f"Error collecting images for {university_id}: {str(e)}")
+        fetched, changed = fetch_images(image_jobs, workers=args.download_workers, revalidate=args.revalidate)
+        save_url_cache()
+        
+        changed_ids = {stem_owners[stem] for stem in changed} - pending_ids
+        for university_id in catalogue['universities']:
+            if university_id in changed_ids:
+                pending.append((university_id, get_page_inputs(university_id, catalogue)))
+    
+    # Generate HTML
+    with timed('stage.pages'):
+        results, errors = build_pages(pending, catalogue, jobs=args.jobs, fetched=fetched, journal=journal)
+    new_manifest['pages'].update(results)
+    new_manifest['pages'] = dict(sorted(new_manifest['pages'].items()))
+    
+    skipped = len(catalogue['universities']) - len(pending)
+    count('pages.generated', len(results))
+    count('pages.skipped', skipped)
+    count('pages.failed', len(errors))
+    print(f"Generated {len(results)} page(s), skipped {skipped} unchanged, {len(errors)} failed")
+    for university_id, e in errors:
+        print(f"Error generating page for {university_id}: {str(e)}")
+    
+    # Update index.json
+    with timed('stage.index'):
+        update_index_json(catalogue, compress=args.compress_index, stream=args.stream)
+        write_lineage_json(catalogue)
+    
+    # Record what was built so the next incremental run can skip it. The
+    # journal is only needed until the manifest is safely written.
+    with timed('stage.finish'):
+        save_json_file(new_manifest, MANIFEST_PATH)
+        journal.close()
+        JOURNAL_PATH.unlink()
+        prune_blob_store()
+        save_url_cache()
+    
+    # Bundle the site for deployment
+    if args.dist:
+        with timed('stage.dist'):
+            build_dist(args.dist)
+    
+    return 1 if errors else 0
+
+# Development server: files it reacts to, how often it looks at them and
+# the event stream through which pages are told to reload
+WATCHED_FILES = [('data/universities', '.json'), ('templates', '.html'), ('.', '.css'), ('.', '.js'), ('.', '.html')]
+WATCH_INTERVAL = 0.2
+RELOAD_PATH = '/__reload'
+RELOAD_SCRIPT = f"<script>new EventSource('{RELOAD_PATH}').onmessage = function () {{ location.reload(); }};</script>\n"
+
+_reload = {'version': 0}
+_reload_condition = threading.Condition()
+
+def notify_reload():
+    """Tell every open page to reload."""
+    with _reload_condition:
+        _reload['version'] += 1
+        _reload_condition.notify_all()
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """Serve the site root without caching, adding live reload to HTML pages."""
+    
+    def end_headers(self):
+        self.send_header('Cache-Control', 'no-store')
+        super().end_headers()
+    
+    def do_GET(self):
+        if self.path == RELOAD_PATH:
+            self.send_reload_events()
+            return
+        
+        file_path = Path(self.translate_path(self.path))
+        if file_path.is_dir() and urlparse(self.path).path.endswith('/'):
+            file_path = file_path / 'index.html'
+        if file_path.suffix != '.html' or not file_path.is_file():
+            super().do_GET()
+            return
+        
         try:
-            # Load university data
-            university_data = load_json_file(json_file)
-            
-            # Use the sanitized ID from the JSON file
-            university_id = university_data.get('id', sanitize_id(university_data['name']))
-            
-            # Save the updated JSON file
-            save_json_file(university_data, json_file)
-            
-            universities_data.append(university_data)
-            
-            # Generate HTML
-            generate_university_page(university_id, university_data)
+            content = read_text_file(file_path)
+        except UnicodeDecodeError:
+            # Served as is, without live reload
+            super().do_GET()
+            return
+        position = content.rfind('</body>')
+        if position == -1:
+            position = len(content)
+        data = (content[:position] + RELOAD_SCRIPT + content[position:]).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def send_reload_events(self):
+        """Stream a server-sent event each time ``notify_reload`` is called."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        with _reload_condition:
+            version = _reload['version']
+        try:
+            while True:
+                with _reload_condition:
+                    _reload_condition.wait_for(lambda: _reload['version'] != version, timeout=15)
+                    changed = _reload['version'] != version
+                    version = _reload['version']
+                # Comments keep idle connections open
+                self.wfile.write(b'data: reload\n\n' if changed else b': ping\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def log_message(self, format, *args):
+        pass
+
+def get_watched_files():
+    """Return the modification time of every file the dev server reacts to."""
+    mtimes = {}
+    for directory, suffix in WATCHED_FILES:
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            # index.json is written by the build itself
+            if not entry.name.endswith(suffix) or entry.name == 'index.json':
+                continue
+            try:
+                mtimes[Path(directory) / entry.name] = entry.stat().st_mtime_ns
+            except FileNotFoundError:
+                pass
+    return mtimes
+
+def refresh_catalogue(catalogue, json_files, keep_records=True):
+    """Re-read changed, added and deleted university files into the catalogue.
+
+    Returns (page_ids, index_changed): the pages to regenerate, i.e. the
+    changed records, everything in their lineage before and after the change
+    and every page referring to them by name; and whether the front-page
+    index has to be rewritten.
+    """
+    ids_by_file = {json_file: university_id for university_id, json_file in catalogue['files'].items()}
+    changed_ids = set()
+    name_keys = set()
+    index_changed = False
+    
+    for json_file in json_files:
+        old_id = ids_by_file.get(json_file)
+        old_entry = catalogue['entries'].get(old_id)
+        old_logo = catalogue['currentLogos'].get(old_id)
+        university_id = None
+        if json_file.exists():
+            try:
+                university_id, university_data, content, _ = load_university_file(json_file)
+                owner = catalogue['files'].get(university_id)
+                if owner is not None and owner != json_file:
+                    raise ValueError(f"id {university_id!r} is already used by {owner.name}")
+            except Exception as e:
+                for message in str(e).splitlines():
+                    print(f"Error processing {json_file.name}: {message}")
+                continue
+        
+        if old_id is not None and old_id != university_id:
+            remove_catalogue_record(catalogue, old_id)
+        if university_id is not None:
+            add_catalogue_record(catalogue, university_id, json_file, university_data, content, keep_records)
+        new_entry = catalogue['entries'].get(university_id)
+        for entry in (old_entry, new_entry):
+            if entry is not None:
+                changed_ids.add(entry['id'])
+                name_keys.update({entry['id'], sanitize_id(entry['name'])})
+        index_changed |= old_entry != new_entry or old_logo != catalogue['currentLogos'].get(university_id)
+    
+    if not changed_ids:
+        return [], False
+    
+    old_graph = catalogue['graph']
+    index_catalogue_names(catalogue)
+    catalogue['graph'] = build_relationship_graph(catalogue)
+    page_ids = set(changed_ids)
+    for university_id in changed_ids:
+        for graph in (old_graph, catalogue['graph']):
+            for _, edge in LINEAGE_WALKS:
+                page_ids.update(entry['id'] for entry in get_lineage(graph, university_id, (edge,)))
+    page_ids.update(university_id for university_id, related in catalogue['related'].items()
+                    if name_keys.intersection(related))
+    return sorted(page_ids & catalogue['files'].keys()), index_changed
+
+def serve(args):
+    """Serve the site locally and regenerate what changes as files are edited.
+
+    Runs an incremental build, serves the site root on ``args.host`` and
+    ``args.port`` and polls the university records, templates and static
+    files. An edited record only regenerates its own page, the pages in its
+    lineage and the pages naming it, plus the index if its entry changed; a
+    template change regenerates every page. Open pages reload themselves
+    once the files are written.
+    """
+    args.incremental = True
+    keep_records = not args.stream
+    catalogue = load_catalogue('data/universities', keep_records=keep_records, normalize=args.normalize)
+    build(args, catalogue)
+    manifest = load_manifest()
+    
+    server = ThreadingHTTPServer((args.host, args.port), partial(DevRequestHandler, directory=os.getcwd()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving on http://{args.host}:{server.server_address[1]}/ - watching for changes, Ctrl+C to stop")
+    
+    mtimes = get_watched_files()
+    try:
+        while True:
+            time.sleep(WATCH_INTERVAL)
+            new_mtimes = get_watched_files()
+            changed = {path for path in mtimes.keys() | new_mtimes.keys() if mtimes.get(path) != new_mtimes.get(path)}
+            mtimes = new_mtimes
+            if not changed:
+                continue
             
+            start = time.perf_counter()
+            if any(path.parent == Path('templates') for path in changed):
+                print("Templates changed, regenerating every page")
+                clear_template_cache()
+                build(args, catalogue)
+                manifest = load_manifest()
+            else:
+                json_files = sorted(path for path in changed if path.parent == Path('data/universities'))
+                page_ids, index_changed = refresh_catalogue(catalogue, json_files, keep_records)
+                if page_ids:
+                    results, errors = build_pages([(university_id, get_page_inputs(university_id, catalogue))
+                                                   for university_id in page_ids], catalogue, jobs=args.jobs)
+                    manifest['pages'].update(results)
+                    for university_id, e in errors:
+                        print(f"Error generating page for {university_id}: {str(e)}")
+                if index_changed:
+                    update_index_json(catalogue)
+                if json_files:
+                    write_lineage_json(catalogue)
+                    save_url_cache()
+            print(f"Updated after changes to {', '.join(sorted(path.name for path in changed))} "
+                  f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+            notify_reload()
+    except KeyboardInterrupt:
+        print("Stopping")
+    finally:
+        server.shutdown()
+        # Keep later incremental builds aware of the pages regenerated here
+        manifest['pages'] = {university_id: entry for university_id, entry in sorted(manifest['pages'].items())
+                             if university_id in catalogue['files']}
+        save_json_file(manifest, MANIFEST_PATH)
+    return 0
+
+# Bulk import and export of university records as NDJSON (one record per
+# line) or CSV (list fields as JSON in their cells)
+CSV_COLUMNS = ['id', 'name', 'city', 'country', 'founded',
+               'logoHistory', 'specialOccasions', 'predecessors', 'parentInstitutions']
+CSV_LIST_COLUMNS = CSV_COLUMNS[5:]
+
+# How entries of the list fields are matched when merging an import into an
+# existing record: logos by image URL, relations by sanitized name
+IMPORT_LIST_KEYS = {
+    'logoHistory': lambda entry: entry.get('imageUrl'),
+    'specialOccasions': lambda entry: entry.get('imageUrl'),
+    'predecessors': lambda entry: sanitize_id(str(entry.get('name', ''))),
+    'parentInstitutions': lambda entry: sanitize_id(str(entry.get('name', ''))),
+}
+
+def get_records_format(path, file_format=None):
+    """Return 'csv' or 'ndjson': the given format, or the one the file name suggests."""
+    if file_format:
+        return file_format
+    return 'csv' if str(path).lower().endswith('.csv') else 'ndjson'
+
+def open_records_file(path, mode='r'):
+    """Open a records file for ``import``/``export``; '-' is standard input/output."""
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    return open(path, mode, encoding='utf-8', newline='')
+
+def csv_row_to_record(row):
+    """Turn a CSV row into a (possibly partial) university record.
+
+    Empty cells are left out, so that they don't overwrite existing fields.
+    Other scalar cells become strings; see ``merge_university`` for how they
+    keep the type of an existing number.
+    """
+    record = {}
+    for column, value in row.items():
+        if column is None or not value:
+            continue
+        if column in ('city', 'country'):
+            record.setdefault('location', {})[column] = value
+        elif column in CSV_LIST_COLUMNS:
+            record[column] = parse_json(value)
+        else:
+            record[column] = value
+    return record
+
+def record_to_csv_row(university_data):
+    """Flatten a university record into a row of ``CSV_COLUMNS``."""
+    location = university_data.get('location', {})
+    row = {column: university_data.get(column, '') for column in ('id', 'name', 'founded')}
+    row.update(city=location.get('city', ''), country=location.get('country', ''))
+    for column in CSV_LIST_COLUMNS:
+        # Absent lists stay absent, so an export imports back unchanged
+        if column in university_data:
+            row[column] = json.dumps(university_data[column], ensure_ascii=False)
+    return row
+
+def iter_import_records(f, file_format='ndjson'):
+    """Yield (line number, record) for every record in an NDJSON or CSV stream.
+
+    The stream is read one line (or row) at a time. Records that cannot be
+    parsed are reported and yielded as None.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            try:
+                yield reader.line_num, csv_row_to_record(row)
+            except ValueError as e:
+                print(f"Error importing line {reader.line_num}: invalid JSON: {e}")
+                yield reader.line_num, None
+        return
+    
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, parse_json(line)
+        except ValueError as e:
+            print(f"Error importing line {line_number}: invalid JSON: {e}")
+            yield line_number, None
+
+def keep_number_type(existing, value):
+    """Return ``existing`` if it is a number whose text is ``value``, else ``value``."""
+    if isinstance(value, str) and isinstance(existing, (int, float)) and not isinstance(existing, bool):
+        if str(existing) == value:
+            return existing
+    return value
+
+def merge_university(existing, incoming, text_cells=False):
+    """Merge an imported record into an existing one and return the result.
+
+    Fields of the import replace the existing ones, except that ``location``
+    is merged key by key and the list fields entry by entry: entries matching
+    an existing one (see ``IMPORT_LIST_KEYS``) replace it, others are
+    appended. The existing ``id`` is kept.
+
+    With ``text_cells`` (CSV input, where every scalar is text), a string
+    equal to the text of an existing number, such as "1876" for 1876, keeps
+    the number, so a CSV round trip does not change types.
+    """
+    merged = dict(existing)
+    for key, value in incoming.items():
+        if key == 'id':
+            continue
+        if text_cells:
+            value = keep_number_type(existing.get(key), value)
+        if key == 'location' and isinstance(value, dict) and isinstance(existing.get(key), dict):
+            if text_cells:
+                value = {field: keep_number_type(existing[key].get(field), text) for field, text in value.items()}
+            merged[key] = dict(existing[key], **value)
+        elif key in IMPORT_LIST_KEYS and isinstance(value, list) and isinstance(existing.get(key), list):
+            get_key = IMPORT_LIST_KEYS[key]
+            entries = list(existing[key])
+            positions = {get_key(entry): number for number, entry in enumerate(entries) if isinstance(entry, dict)}
+            for entry in value:
+                position = positions.get(get_key(entry)) if isinstance(entry, dict) else None
+                if position is None:
+                    if isinstance(entry, dict):
+                        positions[get_key(entry)] = len(entries)
+                    entries.append(entry)
+                else:
+                    entries[position] = entry
+            merged[key] = entries
+        else:
+            merged[key] = value
+    return merged
+
+def import_records(records, catalogue, json_dir='data/universities', text_cells=False):
+    """Merge (line number, record) pairs into the university files.
+
+    Records are matched to existing ones by ``sanitize_id`` of their name,
+    so repeated records in the input are merged one after another. Each
+    merged record is validated and written right away, only if it changed;
+    invalid records are reported and skipped. Nothing but the catalogue's
+    slim metadata is held in memory. ``text_cells`` is passed on to
+    ``merge_university`` for CSV input. Returns (changed_files, counts), where
+    ``counts`` has the number of created, updated, unchanged and invalid
+    records.
+    """
+    json_dir = Path(json_dir)
+    json_dir.mkdir(parents=True, exist_ok=True)
+    created_files = {}
+    changed_files = set()
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'invalid': 0}
+    
+    for line_number, record in records:
+        if record is None:
+            counts['invalid'] += 1
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get('name'), str) or not sanitize_id(record['name']):
+            print(f"Error importing line {line_number}: name: missing")
+            counts['invalid'] += 1
+            continue
+        
+        name_key = sanitize_id(record['name'])
+        existing_id = catalogue['byName'].get(name_key)
+        json_file = catalogue['files'][existing_id] if existing_id is not None else created_files.get(name_key)
+        is_new = json_file is None or not json_file.exists()
+        existing_content = None
+        if is_new:
+            university_data = {'id': name_key, 'specialOccasions': [], 'predecessors': [], 'parentInstitutions': []}
+            university_data.update(record)
+        else:
+            try:
+                _, existing_data, existing_content, _ = load_university_file(json_file)
+            except ValueError as e:
+                print(f"Error importing line {line_number}: {json_file.name} is invalid: {str(e).splitlines()[0]}")
+                counts['invalid'] += 1
+                continue
+            university_data = merge_university(existing_data, record, text_cells)
+        
+        errors = validate_university(university_data)
+        if is_new and not errors:
+            # New records are saved under their ID, which must not be taken
+            json_file = json_dir / f"{university_data['id']}.json"
+            if university_data['id'] in catalogue['files'] or json_file.exists():
+                errors.append(f"id: {university_data['id']!r} is already used by another record")
+        if errors:
+            for message in errors:
+                print(f"Error importing line {line_number} ({record['name']}): {message}")
+            counts['invalid'] += 1
+            continue
+        
+        # Compared in normalized form, so line endings alone never count as a change
+        content = json.dumps(university_data, indent=2, ensure_ascii=False)
+        if content != existing_content and write_if_changed(json_file, content):
+            counts['created' if is_new else 'updated'] += 1
+            changed_files.add(json_file)
+            if is_new:
+                created_files[name_key] = json_file
+        else:
+            counts['unchanged'] += 1
+    
+    return sorted(changed_files), counts
+
+def regenerate_pages(catalogue, page_ids, index_changed, jobs=1, download_workers=8):
+    """Regenerate the given pages, downloading their images first.
+
+    The index is rewritten if ``index_changed``, and the lineage data and the
+    incremental build manifest are kept up to date. Returns the errors.
+    """
+    Path('universities').mkdir(exist_ok=True)
+    image_jobs = []
+    for university_id in page_ids:
+        try:
+            for _, url, stem in get_image_jobs(university_id, get_university(catalogue, university_id), catalogue):
+                image_jobs.append((url, stem))
         except Exception as e:
-            print(f"Error processing {json_file.name}: {str(e)}")
+            print(f"Error collecting images for {university_id}: {str(e)}")
+    fetched, _ = fetch_images(image_jobs, workers=download_workers)
     
-    # Update index.json
-    update_index_json(universities_data)
+    manifest = load_manifest()
+    results, errors = build_pages([(university_id, get_page_inputs(university_id, catalogue))
+                                   for university_id in page_ids], catalogue, jobs=jobs, fetched=fetched)
+    manifest['pages'].update(results)
+    manifest['pages'] = dict(sorted(manifest['pages'].items()))
+    print(f"Generated {len(results)} page(s), {len(errors)} failed")
+    for university_id, e in errors:
+        print(f"Error generating page for {university_id}: {str(e)}")
+    
+    if index_changed:
+        update_index_json(catalogue)
+    write_lineage_json(catalogue)
+    save_json_file(manifest, MANIFEST_PATH)
+    save_url_cache()
+    return errors
+
+def import_catalogue(path, file_format=None, json_dir='data/universities', jobs=1, download_workers=8):
+    """Import records from an NDJSON or CSV file and regenerate what they affect.
+
+    Only the pages of the changed records, the pages in their lineage and
+    the pages naming them are regenerated, with their images. Returns the
+    process exit code: 1 if a record was invalid or a page failed.
+    """
+    catalogue = load_catalogue(json_dir, keep_records=False)
+    file_format = get_records_format(path, file_format)
+    with open_records_file(path) as f:
+        changed_files, counts = import_records(iter_import_records(f, file_format), catalogue, json_dir,
+                                               text_cells=file_format == 'csv')
+    print(f"Imported {sum(counts.values())} record(s): {counts['created']} created, {counts['updated']} updated, "
+          f"{counts['unchanged']} unchanged, {counts['invalid']} invalid")
+    
+    page_ids, index_changed = refresh_catalogue(catalogue, changed_files, keep_records=False)
+    errors = []
+    if page_ids:
+        errors = regenerate_pages(catalogue, page_ids, index_changed, jobs=jobs, download_workers=download_workers)
+    return 1 if counts['invalid'] or errors else 0
+
+def export_catalogue(path, file_format=None, json_dir='data/universities'):
+    """Write every valid university record to an NDJSON or CSV file, one at a time."""
+    file_format = get_records_format(path, file_format)
+    exported = 0
+    with open_records_file(path, 'w') as f:
+        writer = csv.DictWriter(f, CSV_COLUMNS) if file_format == 'csv' else None
+        if writer is not None:
+            writer.writeheader()
+        for json_file in sorted(Path(json_dir).glob('*.json')):
+            if json_file.name == 'index.json':
+                continue
+            try:
+                _, university_data, _, _ = load_university_file(json_file)
+            except Exception as e:
+                for message in str(e).splitlines():
+                    print(f"Error processing {json_file.name}: {message}", file=sys.stderr)
+                continue
+            if writer is not None:
+                writer.writerow(record_to_csv_row(university_data))
+            else:
+                f.write(json.dumps(university_data, ensure_ascii=False) + '\n')
+            exported += 1
+    print(f"Exported {exported} record(s)", file=sys.stderr)
+    return 0
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.check:
+        return check_catalogue('data/universities', workers=args.jobs if args.jobs > 1 else None)
+    if args.command == 'serve':
+        return serve(args)
+    if args.command == 'import':
+        return import_catalogue(args.path, args.format, jobs=args.jobs, download_workers=args.download_workers)
+    if args.command == 'export':
+        return export_catalogue(args.path, args.format)
+    
+    reset_stats()
+    start = time.perf_counter()
+    if args.profile:
+        # Only the main thread is profiled; use --jobs 1 to include page rendering
+        profiler = cProfile.Profile()
+        exit_code = profiler.runcall(build, args)
+        profiler.dump_stats(args.profile)
+        print(f"Wrote profile to {args.profile}")
+    else:
+        exit_code = build(args)
+    
+    if args.report:
+        report = get_build_report(time.perf_counter() - start)
+        save_json_file(report, args.report)
+        stages = ', '.join(f"{name[len('stage.'):]} {timing['seconds']:.2f}s"
+                           for name, timing in report['timings'].items() if name.startswith('stage.'))
+        print(f"Build took {report['wallSeconds']:.2f}s ({stages}); wrote report to {args.report}")
+    
+    return exit_code
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    sys.exit(main())
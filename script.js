@@ -2,6 +2,11 @@
 let universitiesCache = null;
 let selectedCountry = null;
 
+// Sharded index manifest and the shards fetched so far
+let indexManifest = null;
+const shardCache = new Map();
+let universitiesById = null;
+
 // Debounce function to limit how often a function can be called
 function debounce(func, wait) {
     let timeout;
@@ -20,14 +25,8 @@ function formatLocation(location) {
     return `${location.city}, ${location.country}`;
 }
 
-// Get unique countries from universities
-function getUniqueCountries(universities) {
-    return [...new Set(universities.map(u => u.location.country))].sort();
-}
-
-// Create country filter
-function createCountryFilter(universities) {
-    const countries = getUniqueCountries(universities);
+// Create country filter from the index manifest
+function createCountryFilter(countries) {
     const filterContainer = document.createElement('div');
     filterContainer.className = 'country-filter';
     
@@ -41,10 +40,10 @@ function createCountryFilter(universities) {
     select.appendChild(allOption);
     
     // Add country options
-    countries.forEach(country => {
+    countries.forEach(({ country, count }) => {
         const option = document.createElement('option');
         option.value = country;
-        option.textContent = country;
+        option.textContent = `${country} (${count})`;
         select.appendChild(option);
     });
     
@@ -52,34 +51,196 @@ function createCountryFilter(universities) {
     return filterContainer;
 }
 
-// Normalize text by removing accents and converting to lowercase
-function normalizeText(text) {
-    return text.normalize('NFD')
-              .replace(/[\u0300-\u036f]/g, '')
-              .toLowerCase();
+// Fetch one country shard of the index (shards are immutable, so each is fetched once)
+function loadShard(shardEntry) {
+    if (!shardCache.has(shardEntry.shard)) {
+        const request = fetch(`data/index/${shardEntry.shard}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .then(shard => shard.universities)
+            .catch(error => {
+                shardCache.delete(shardEntry.shard);
+                throw error;
+            });
+        shardCache.set(shardEntry.shard, request);
+    }
+    return shardCache.get(shardEntry.shard);
+}
+
+// Fetch every shard and assemble the full catalogue
+async function loadAllShards() {
+    if (!universitiesCache) {
+        const shards = await Promise.all(indexManifest.countries.map(loadShard));
+        universitiesCache = shards.flat().sort((a, b) => a.name.localeCompare(b.name));
+        universitiesById = new Map(universitiesCache.map(university => [university.id, university]));
+    }
+    return universitiesCache;
+}
+
+// Universities to search, loading only the selected country's shard if needed
+async function getUniversitiesForCountry(country) {
+    if (universitiesCache) return universitiesCache;
+    if (country) {
+        const shardEntry = indexManifest.countries.find(entry => entry.country === country);
+        return shardEntry ? loadShard(shardEntry) : [];
+    }
+    return loadAllShards();
+}
+
+// Fold text to lowercase ASCII tokens, matching get_search_tokens in generate_pages.py
+function getSearchTokens(text) {
+    return text.normalize('NFKD')
+              .replace(/[^\x00-\x7f]/g, '')
+              .toLowerCase()
+              .match(/[a-z0-9]+/g) || [];
+}
+
+// Build an index manifest from data/universities/index.json, for sites whose
+// sharded index has not been generated yet. The whole catalogue is loaded at
+// once and there is no prebuilt search index.
+async function loadLegacyIndex() {
+    const response = await fetch('data/universities/index.json');
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    const data = await response.json();
+    universitiesCache = data.universities.slice().sort((a, b) => a.name.localeCompare(b.name));
+    universitiesById = new Map(universitiesCache.map(university => [university.id, university]));
+    
+    const counts = new Map();
+    for (const university of universitiesCache) {
+        const country = university.location.country;
+        counts.set(country, (counts.get(country) || 0) + 1);
+    }
+    return {
+        total: universitiesCache.length,
+        countries: [...counts.keys()].sort().map(country => ({ country, count: counts.get(country) })),
+        search: null,
+        first: universitiesCache,
+    };
+}
+
+// Whether every query token prefixes a name, city or country token of a university
+function matchesSearch(university, terms) {
+    const tokens = getSearchTokens(
+        `${university.name} ${university.location.city} ${university.location.country}`);
+    return terms.every(term => tokens.some(token => token.startsWith(term)));
+}
+
+// Fetch the prebuilt search index referenced by the manifest (once)
+let searchIndexRequest = null;
+function loadSearchIndex() {
+    if (!searchIndexRequest) {
+        searchIndexRequest = fetch(`data/index/${indexManifest.search.path}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP error! status: ${response.status}`);
+                }
+                return response.json();
+            })
+            .catch(error => {
+                searchIndexRequest = null;
+                throw error;
+            });
+    }
+    return searchIndexRequest;
+}
+
+// Index of the first token that is not smaller than value
+function lowerBound(tokens, value) {
+    let low = 0;
+    let high = tokens.length;
+    while (low < high) {
+        const middle = (low + high) >>> 1;
+        if (tokens[middle] < value) {
+            low = middle + 1;
+        } else {
+            high = middle;
+        }
+    }
+    return low;
+}
+
+// IDs of the universities where every query token prefixes a name, city or country token
+function searchUniversities(searchIndex, query, country) {
+    const terms = getSearchTokens(query).slice(0, 255);
+    const docCount = searchIndex.ids.length;
+    const countryNumber = country ? searchIndex.countries.findIndex(([name]) => name === country) : -1;
+    
+    // counts[doc] is the number of leading terms the document has matched so far
+    const counts = new Uint8Array(docCount);
+    terms.forEach((term, termNumber) => {
+        const start = lowerBound(searchIndex.tokens, term);
+        const end = lowerBound(searchIndex.tokens, term + '\x7f');
+        for (let position = start; position < end; position++) {
+            const postings = searchIndex.postings[position];
+            for (let i = 0; i < postings.length; i++) {
+                if (counts[postings[i]] === termNumber) {
+                    counts[postings[i]] = termNumber + 1;
+                }
+            }
+        }
+    });
+    
+    const ids = [];
+    for (let doc = 0; doc < docCount; doc++) {
+        if (counts[doc] === terms.length && (!country || searchIndex.docCountries[doc] === countryNumber)) {
+            ids.push(searchIndex.ids[doc]);
+        }
+    }
+    return ids;
 }
 
-// Filter and display universities based on search and country filter
-function filterAndDisplayUniversities() {
-    if (!universitiesCache) return;
+// Filter and display universities based on search and country filter.
+// Every call is numbered so that a slow, outdated query (say, one still
+// waiting for the search index) cannot overwrite the results of a newer one.
+let filterRequestNumber = 0;
+async function filterAndDisplayUniversities() {
+    if (!indexManifest) return;
     
+    const requestNumber = ++filterRequestNumber;
     const searchInput = document.querySelector('.search-input');
-    const searchTerm = searchInput ? normalizeText(searchInput.value) : '';
+    const searchTerm = searchInput ? searchInput.value : '';
     const countryFilter = document.getElementById('countryFilter');
     const selectedCountry = countryFilter ? countryFilter.value : '';
     
-    const filteredUniversities = universitiesCache.filter(university => {
-        const matchesSearch = 
-            normalizeText(university.name).includes(searchTerm) ||
-            normalizeText(university.location.city).includes(searchTerm) ||
-            normalizeText(university.location.country).includes(searchTerm);
+    try {
+        if (getSearchTokens(searchTerm).length === 0) {
+            const universities = await getUniversitiesForCountry(selectedCountry);
+            if (requestNumber !== filterRequestNumber) return;
+            displayUniversities(universities.filter(university =>
+                !selectedCountry || university.location.country === selectedCountry));
+            return;
+        }
         
-        const matchesCountry = !selectedCountry || university.location.country === selectedCountry;
+        // Without a prebuilt search index the whole catalogue is already loaded
+        if (!indexManifest.search) {
+            const terms = getSearchTokens(searchTerm);
+            displayUniversities(universitiesCache.filter(university =>
+                (!selectedCountry || university.location.country === selectedCountry) &&
+                matchesSearch(university, terms)));
+            return;
+        }
         
-        return matchesSearch && matchesCountry;
-    });
-    
-    displayUniversities(filteredUniversities);
+        const [searchIndex] = await Promise.all([loadSearchIndex(), loadAllShards()]);
+        if (requestNumber !== filterRequestNumber) return;
+        const filteredUniversities = searchUniversities(searchIndex, searchTerm, selectedCountry)
+            .map(id => universitiesById.get(id))
+            .filter(Boolean);
+        
+        displayUniversities(filteredUniversities);
+    } catch (error) {
+        console.error('Error searching universities:', error);
+        if (requestNumber !== filterRequestNumber) return;
+        const grid = document.getElementById('universitiesGrid');
+        if (grid) {
+            grid.innerHTML = '<div class="error">There was a problem searching the universities. Please try again.</div>';
+        }
+    }
 }
 
 // Fetch and display universities
@@ -91,12 +252,17 @@ async function loadUniversities() {
     grid.innerHTML = '<div class="loading">Loading universities...</div>';
     
     try {
-        const response = await fetch('data/universities/index.json');
-        if (!response.ok) {
+        // The manifest is small and carries the first screen of universities;
+        // the per-country shards are fetched afterwards. Sites built before
+        // the sharded index existed only have data/universities/index.json.
+        const response = await fetch('data/index/manifest.json');
+        if (response.status === 404) {
+            indexManifest = await loadLegacyIndex();
+        } else if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
+        } else {
+            indexManifest = await response.json();
         }
-        const data = await response.json();
-        universitiesCache = data.universities;
         
         // Create search container
         const searchContainer = document.createElement('div');
@@ -111,21 +277,28 @@ async function loadUniversities() {
         searchContainer.sty
         
         // Create country filter
-        const countryFilter = createCountryFilter(universitiesCache);
+        const countryFilter = createCountryFilter(indexManifest.countries);
         searchContainer.appendChild(countryFilter);
         
         // Add search container to main
         const main = document.querySelector('main');
         main.insertBefore(searchContainer, main.firstChild);
         
-        // Display universities
-        displayUniversities(universitiesCache);
+        // Display the first screen straight from the manifest
+        displayUniversities(indexManifest.first);
         
         // Setup search functionality
         searchInput.addEventListener('input', debounce(filterAndDisplayUniversities, 300));
         
         // Setup country filter
         countryFilter.querySelector('select').addEventListener('change', filterAndDisplayUniversities);
+        
+        // Lazy-load the rest of the catalogue
+        if (indexManifest.total > indexManifest.first.length) {
+            loadAllShards()
+                .then(filterAndDisplayUniversities)
+                .catch(error => console.error('Error loading university shards:', error));
+        }
     } catch (error) {
         console.error('Error loading universities:', error);
         const main = document.querySelector('main');
@@ -140,31 +313,28 @@ async function loadUniversities() {
 }
 
 
-// Get current logo from university data
-async function getCurrentLogo(universityId) {
-    try {
-        const response = await fetch(`data/universities/${universityId}.json`);
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        const university = await response.json();
-        const sortedHistory = [...university.logoHistory].sort((a, b) => {
-            const yearA = parseInt(a.year);
-            const yearB = parseInt(b.year);
-            if (yearA === yearB) {
-                return a.isEstimated ? 1 : -1;
-            }
-            return yearB - yearA;  // Sort in descending order (newest first)
-        });
-        return sortedHistory[0]?.imageUrl || 'images/placeholder.png';
-    } catch (error) {
-        console.error(`Error getting current logo for ${universityId}:`, error);
-        return 'images/placeholder.png';
+// Build the <img> attributes for a university's current logo from its index entry
+function getLogoAttributes(university) {
+    const logo = university.logo;
+    if (!logo) {
+        return 'src="images/placeholder.png"';
     }
+    const attributes = [`src="${logo.src}"`];
+    if (logo.srcset) {
+        attributes.push(`srcset="${logo.srcset}"`, 'sizes="(max-width: 768px) 100vw, 300px"');
+    }
+    if (logo.width && logo.height) {
+        attributes.push(`width="${logo.width}"`, `height="${logo.height}"`);
+    }
+    if (logo.color) {
+        // Shown as a placeholder until the image has loaded
+        attributes.push(`style="background-color: ${logo.color}"`);
+    }
+    return attributes.join(' ');
 }
 
 // Display universities in the grid
-async function displayUniversities(universities) {
+function displayUniversities(universities) {
     const grid = document.getElementById('universitiesGrid');
     if (!grid) return;
     
@@ -177,10 +347,8 @@ async function displayUniversities(universities) {
         const universityId = university.id;
         card.onclick = () => window.location.href = `universities/${universityId}.html`;
         
-        const currentLogo = await getCurrentLogo(universityId);
-        
         card.innerHTML = `
-            <img src="${currentLogo}" alt="${university.name} logo" onerror="this.src='images/placeholder.png'">
+            <img ${getLogoAttributes(university)} alt="${university.name} logo" loading="lazy" onerror="this.onerror=null; this.removeAttribute('srcset'); this.src='images/placeholder.png'">
             <div class="university-card-content">
                 <h2>${university.name}</h2>
                 <p>Founded: ${university.founded}</p>